@@ -0,0 +1,185 @@
+from urllib.parse import urlencode
+import flask
+import numpy as np
+import pandas as pd
+from config import api_page_size, api_max_page_size, moving_avg_windows
+from http_cache import get_etag, get_matching_etag
+from serialize import dumps
+
+# Rows encoded per chunk of a streamed response
+stream_chunk_rows = 500
+
+# 1 is the raw series
+series_windows = [1] + moving_avg_windows
+
+formats = {'json': 'application/json', 'csv': 'text/csv'}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def get_list_arg(args, name):
+    value = args.get(name)
+    return None if value is None else [item for item in value.split(',') if item]
+
+
+def get_int_arg(args, name, default, maximum=None):
+    try:
+        value = int(args.get(name, default))
+    except ValueError:
+        raise ApiError(400, f'{name} must be an integer')
+    if value < 0:
+        raise ApiError(400, f'{name} must not be negative')
+    if maximum is not None and value > maximum:
+        raise ApiError(400, f'{name} must not be more than {maximum}')
+    return value
+
+
+def get_date_arg(args, name):
+    value = args.get(name)
+    if value is None:
+        return None
+    try:
+        date = pd.Timestamp(value)
+    except ValueError:
+        date = pd.NaT
+    # An empty value parses to NaT rather than raising
+    if pd.isna(date):
+        raise ApiError(400, f'{name} must be a date (YYYY-MM-DD)')
+    return date
+
+
+def select_fields(df, fields):
+    if fields is None:
+        return df
+    unknown = [field for field in fields if field not in df.columns]
+    if unknown:
+        raise ApiError(400, f"Unknown fields {', '.join(unknown)}, available: {', '.join(map(str, df.columns))}")
+    return df[fields]
+
+
+def get_region_rows(metrics_df, args):
+    regions = get_list_arg(args, 'regions')
+    if regions is not None:
+        unknown = [region for region in regions if region not in metrics_df.index]
+        if unknown:
+            raise ApiError(404, f"Unknown regions {', '.join(unknown)}")
+        metrics_df = metrics_df.loc[regions]
+    return select_fields(metrics_df, get_list_arg(args, 'fields'))
+
+
+def get_series_rows(snapshot, region, args):
+    # A (day, metric) view of the snapshot's series store, the same numbers the dashboard plots
+    window = get_int_arg(args, 'window', 1)
+    if window not in series_windows:
+        raise ApiError(400, f"window must be one of {', '.join(map(str, series_windows))}")
+    history = snapshot.history
+    if region not in history:
+        raise ApiError(404, f'Unknown region {region}')
+    series_df = pd.DataFrame(history.region_values(region, window).T, index=history.dates,
+                             columns=list(history.metrics), copy=False)
+    series_df = select_fields(series_df, get_list_arg(args, 'fields'))
+    return series_df.loc[get_date_arg(args, 'start'):get_date_arg(args, 'end')]
+
+
+def get_next_url(args, offset, limit, total):
+    if offset + limit >= total:
+        return None
+    return f'{flask.request.base_url}?{urlencode({**args.to_dict(), "offset": offset + limit})}'
+
+
+def format_index(index):
+    if isinstance(index, pd.DatetimeIndex):
+        return index.strftime('%Y-%m-%d').tolist()
+    return index.tolist()
+
+
+def get_column_values(column):
+    # float32 widened to a Python float shows digits the stored value never had, its shortest repr doesn't
+    if column.dtype == np.float32:
+        return column.astype(str).astype(float).tolist()
+    return column.tolist()
+
+
+def iter_json(page_df, meta):
+    # The envelope goes first so clients know the total before the rows arrive
+    yield dumps(meta)[:-1] + ',"data":['
+    keys = [page_df.index.name or 'index'] + [str(column) for column in page_df.columns]
+    for start in range(0, len(page_df), stream_chunk_rows):
+        chunk_df = page_df.iloc[start:start + stream_chunk_rows]
+        columns = [format_index(chunk_df.index)] + [get_column_values(chunk_df[column]) for column in chunk_df.columns]
+        rows = dumps([dict(zip(keys, row)) for row in zip(*columns)])[1:-1]
+        yield rows if start == 0 else ',' + rows
+    yield ']}'
+
+
+def iter_csv(page_df):
+    index_label = page_df.index.name or 'index'
+    for start in range(0, len(page_df), stream_chunk_rows):
+        yield page_df.iloc[start:start + stream_chunk_rows].to_csv(header=start == 0, index_label=index_label,
+                                                                   date_format='%Y-%m-%d')
+    if page_df.empty:
+        yield page_df.to_csv(index_label=index_label)
+
+
+def stream_rows(rows_df, args, etag):
+    output_format = args.get('format', 'json')
+    if output_format not in formats:
+        raise ApiError(400, f"format must be one of {', '.join(formats)}")
+    offset = get_int_arg(args, 'offset', 0)
+    limit = get_int_arg(args, 'limit', api_page_size, api_max_page_size)
+    total = len(rows_df)
+    page_df = rows_df.iloc[offset:offset + limit]
+    next_url = get_next_url(args, offset, limit, total)
+
+    if output_format == 'json':
+        meta = {'total': total, 'offset': offset, 'limit': limit, 'next': next_url}
+        body = iter_json(page_df, meta)
+    else:
+        body = iter_csv(page_df)
+    response = flask.Response(body, mimetype=formats[output_format])
+    response.headers['X-Total-Count'] = str(total)
+    if next_url is not None:
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def create_api(snapshot_store):
+    # Rows and series straight from the current snapshot. A request keeps the snapshot it started on until its last
+    # row is streamed, and its ETag is a function of that snapshot and the request alone
+    api = flask.Blueprint('data_api', __name__)
+
+    def serve(get_rows, *args):
+        snapshot = snapshot_store.get()
+        request = flask.request
+        etag = get_etag(snapshot.version, request.path, request.query_string)
+        matching_etag = get_matching_etag(request.if_none_match, etag)
+        if matching_etag is not None:
+            response = flask.Response(status=304)
+            response.set_etag(matching_etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        try:
+            return stream_rows(get_rows(snapshot, *args, request.args), request.args, etag)
+        except ApiError as error:
+            return flask.Response(dumps({'error': error.message}), status=error.status, mimetype='application/json')
+
+    @api.route('/states')
+    def states():
+        return serve(lambda snapshot, args: get_region_rows(snapshot.state_metrics_df, args))
+
+    @api.route('/districts')
+    def districts():
+        return serve(lambda snapshot, args: get_region_rows(snapshot.district_metrics_df, args))
+
+    @api.route('/series/<region>')
+    def series(region):
+        return serve(get_series_rows, region)
+
+    return api
@@ -0,0 +1,20 @@
+from flask import Flask
+from flask_compress import Compress
+from artifacts import load_or_build_artifacts
+from api import create_api
+from config import api_prefix, refresh_interval
+from snapshot import Snapshot, SnapshotStore, start_refresher
+
+# Only the data API, to run it apart from the dashboard on an async worker class, e.g.
+# `gunicorn -k gevent --worker-connections 1000 api_main:server` (gevent is not in requirements.txt). Responses are
+# streamed, so a slow client holds a greenlet instead of one of the sync workers the dashboard needs
+data_version, frames = load_or_build_artifacts(served=True)
+snapshot_store = SnapshotStore(Snapshot(data_version, frames))
+
+server = Flask(__name__)
+# The same Flask-Compress dash's compress=True puts in front of the dashboard
+Compress(server)
+server.register_blueprint(create_api(snapshot_store), url_prefix=api_prefix or '/api/v1')
+
+if refresh_interval:
+    start_refresher(snapshot_store)
@@ -0,0 +1,210 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from config import avg_days_to_death, artifacts_dir, input_files, optional_input_files, geojson_tolerance, \
+    geojson_precision, region_metrics_source
+from shared import split_blocks, frame_from_blocks
+from pipeline import build_frames
+from series_store import build_series_store, save_series_store, load_series_store
+from geo import encode_geojson
+from metrics import timed
+
+# Bump whenever the on-disk layout or the pipeline output changes shape
+artifact_format_version = 11
+
+geojson_files = {'identity': '{}.json', 'gzip': '{}.json.gz', 'br': '{}.json.br'}
+
+# The district geometry is None unless its optional input exists
+geojson_names = ['india_geojson', 'district_geojson']
+
+frame_names = ['india_df', 'state_metrics_df', 'district_metrics_df', 'date_wise_metrics', 'vaccine_cumulative_df',
+               'pending_vaccine_df']
+
+# A served snapshot maps the series store built from date_wise_metrics instead, only ingest.py reads the frame back
+served_frame_names = [name for name in frame_names if name != 'date_wise_metrics']
+
+
+def get_input_paths():
+    return input_files + [path for path in optional_input_files if os.path.exists(path)]
+
+
+def get_input_hash(paths=None):
+    if paths is None:
+        paths = get_input_paths()
+    digest = hashlib.sha256()
+    digest.update(f'{artifact_format_version}:{avg_days_to_death}:{geojson_tolerance}:{geojson_precision}:'
+                  f'{region_metrics_source}'.encode())
+    for path in paths:
+        digest.update(path.encode())
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def _to_json_label(label):
+    return list(label) if isinstance(label, tuple) else label
+
+
+def _from_json_label(label):
+    return tuple(label) if isinstance(label, list) else label
+
+
+def save_frame(df, path):
+    os.makedirs(path)
+    meta = {
+        'columns': [_to_json_label(col) for col in df.columns],
+        'column_names': list(df.columns.names),
+        'index_name': df.index.name,
+        'blocks': [],
+        'object_blocks': [],
+    }
+
+    if isinstance(df.index, pd.DatetimeIndex):
+        np.save(os.path.join(path, 'index.npy'), df.index.values)
+        meta['index'] = 'index.npy'
+    else:
+        meta['index'] = df.index.tolist()
+
+    # One file per pandas block, stored (column, row) so each column is a contiguous run on disk
+    for positions, values in split_blocks(df):
+        if values.dtype == object:
+            rows = [[None if pd.isna(v) else v for v in column] for column in values]
+            meta['object_blocks'].append({'positions': positions, 'values': rows})
+            continue
+        file_name = f'block_{len(meta["blocks"])}.npy'
+        np.save(os.path.join(path, file_name), values)
+        meta['blocks'].append({'file': file_name, 'positions': positions})
+
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+
+def load_frame(path):
+    with open(os.path.join(path, 'meta.json'), 'r') as f:
+        meta = json.load(f)
+
+    if meta['index'] == 'index.npy':
+        index = pd.DatetimeIndex(np.load(os.path.join(path, 'index.npy'), mmap_mode='r'), name=meta['index_name'])
+    else:
+        index = pd.Index(meta['index'], name=meta['index_name'])
+
+    columns = [_from_json_label(col) for col in meta['columns']]
+    if columns and isinstance(columns[0], tuple):
+        columns = pd.MultiIndex.from_tuples(columns, names=meta['column_names'])
+    else:
+        columns = pd.Index(columns, name=meta['column_names'][0])
+
+    blocks = [(block['positions'], np.load(os.path.join(path, block['file']), mmap_mode='r'))
+              for block in meta['blocks']]
+    for block in meta['object_blocks']:
+        values = [[np.nan if v is None else v for v in column] for column in block['values']]
+        blocks.append((block['positions'], np.array(values, dtype=object)))
+
+    return frame_from_blocks(blocks, index, columns)
+
+
+@timed
+def save_artifacts(frames, version):
+    os.makedirs(artifacts_dir, exist_ok=True)
+    # Write into a scratch dir and rename it into place so concurrent workers never see a half-written version
+    tmp_path = tempfile.mkdtemp(prefix=f'.{version}-', dir=artifacts_dir)
+    for name in frame_names:
+        save_frame(frames[name], os.path.join(tmp_path, name))
+    # Always rebuilt, frames ingest.py updated still carry the store they were loaded with
+    save_series_store(build_series_store(frames['india_df'], frames['date_wise_metrics']),
+                      os.path.join(tmp_path, 'series_store'))
+    # The map geometry is served as a static file, so it is stored already encoded for every Content-Encoding
+    for name in geojson_names:
+        if frames.get(name) is None:
+            continue
+        encoded = frames.get(f'{name}_encoded') or encode_geojson(frames[name])
+        for encoding, body in encoded.items():
+            with open(os.path.join(tmp_path, geojson_files[encoding].format(name)), 'wb') as f:
+                f.write(body)
+    with open(os.path.join(tmp_path, 'manifest.json'), 'w') as f:
+        json.dump({'version': version, 'format': artifact_format_version, 'frames': frame_names}, f)
+
+    path = os.path.join(artifacts_dir, version)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # Another worker got there first
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+    for entry in os.listdir(artifacts_dir):
+        if entry != version and not entry.startswith('.'):
+            shutil.rmtree(os.path.join(artifacts_dir, entry), ignore_errors=True)
+
+    return path
+
+
+@timed
+def load_artifacts(path, served=False):
+    names = served_frame_names if served else frame_names
+    frames = {name: load_frame(os.path.join(path, name)) for name in names}
+    if served:
+        frames['series_store'] = load_series_store(os.path.join(path, 'series_store'))
+    for name in geojson_names:
+        encoded = {}
+        for encoding, file_name in geojson_files.items():
+            file_path = os.path.join(path, file_name.format(name))
+            if os.path.exists(file_path):
+                with open(file_path, 'rb') as f:
+                    encoded[encoding] = f.read()
+        frames[name] = json.loads(encoded['identity']) if encoded else None
+        frames[f'{name}_encoded'] = encoded or None
+    return frames
+
+
+@timed
+def load_or_build_artifacts(served=False):
+    version = get_input_hash()
+    path = os.path.join(artifacts_dir, version)
+    if os.path.exists(os.path.join(path, 'manifest.json')):
+        return version, load_artifacts(path, served)
+
+    frames = build_frames()
+    try:
+        path = save_artifacts(frames, version)
+    except OSError:
+        # Read-only filesystem, serve the freshly computed frames from memory
+        return version, frames
+    return version, load_artifacts(path, served)
+
+
+def has_artifacts(version):
+    return os.path.exists(os.path.join(artifacts_dir, version, 'manifest.json'))
+
+
+def load_built_artifacts(version):
+    if has_artifacts(version):
+        return load_artifacts(os.path.join(artifacts_dir, version), served=True)
+    return None
+
+
+def build_artifacts_once():
+    # Of every process that notices new inputs only the one holding the lock builds and saves them, the others get
+    # None and map the saved version on a later check instead of building it as well
+    try:
+        os.makedirs(artifacts_dir, exist_ok=True)
+        lock = open(os.path.join(artifacts_dir, '.build.lock'), 'w')
+    except OSError:
+        # Read-only filesystem, every process has to build its own
+        return load_or_build_artifacts(served=True)
+    with lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        return load_or_build_artifacts(served=True)
+
+
+if __name__ == '__main__':
+    version, _ = load_or_build_artifacts()
+    print(f'Artifacts ready at {os.path.join(artifacts_dir, version)}')
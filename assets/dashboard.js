@@ -0,0 +1,71 @@
+// Clientside rendering mode (CLIENTSIDE=1): the page_data store holds every series and KPI text once, and these
+// functions fill the card templates rendered by the server for whichever state is selected
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    dashboard: (function () {
+        const dayMs = 24 * 60 * 60 * 1000;
+
+        function clone(value) {
+            return JSON.parse(JSON.stringify(value));
+        }
+
+        function decodeDates(dates) {
+            if (Array.isArray(dates)) {
+                return dates.map(function (day) { return day + 'T00:00:00'; });
+            }
+            const start = Date.parse(dates.start + 'T00:00:00Z');
+            const decoded = new Array(dates.days);
+            for (let i = 0; i < dates.days; i++) {
+                decoded[i] = new Date(start + i * dayMs).toISOString().slice(0, 19);
+            }
+            return decoded;
+        }
+
+        function decodeSeries(deltas, scale) {
+            let total = 0;
+            return deltas.map(function (delta) {
+                if (delta === null) {
+                    return null;
+                }
+                total += delta;
+                return total / scale;
+            });
+        }
+
+        function kpiCard(stateName, metric, data) {
+            const card = clone(data.templates.kpi[metric][stateName === 'India' ? 'India' : 'state']);
+            const texts = data.kpis[stateName][metric];
+            const children = card.props.children;
+            children[0].props.children = stateName + ' - ' + data.labels[metric];
+            children[1].props.children = texts[0];
+            children[2].props.children = texts[1];
+            children[2].props.style.color = texts[2];
+            children[3].props.children = texts[3];
+            return card;
+        }
+
+        return {
+            kpi_cards: function (stateName, data, metrics) {
+                if (!data || !data.kpis[stateName]) {
+                    return metrics.map(function () { return window.dash_clientside.no_update; });
+                }
+                return metrics.map(function (metric) { return kpiCard(stateName, metric, data); });
+            },
+
+            plot_card: function (stateName, data, metric) {
+                const isIndia = stateName === 'India';
+                if (!data || !data.kpis[stateName] || !data.series[metric].regions[stateName]) {
+                    return [window.dash_clientside.no_update];
+                }
+                const card = clone(data.templates.plot[metric][isIndia ? 'India' : 'state']);
+                card.props.children[0].props.children = stateName + ' - ' + data.labels[metric];
+                const trace = card.props.children[1].props.children.props.children.props.figure.data[0];
+                trace.x = decodeDates(data.dates);
+                trace.y = decodeSeries(data.series[metric].regions[stateName], data.series[metric].scale);
+                if (!isIndia) {
+                    trace.name = stateName;
+                }
+                return [card];
+            }
+        };
+    })()
+});
@@ -0,0 +1,353 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import columnar
+from helper import clean_raw_data, read_daily_csv, load_daily_df, modify_geojson, get_modified_state_metrics_df, \
+    state_abbreviations_dict
+from vaccine import load_vaccine_data, load_cowin_df, read_cowin_csv, get_daily_vaccinations_df, \
+    get_vaccine_cumulative_df, dose_columns
+from india_overall import get_india_df
+from state_level import get_state_metrics_df
+from district_level import get_district_metrics_df
+from date_wise import get_date_wise_metrics, get_date_wise_metrics_pandas
+from config import moving_avg_days
+from series_store import build_series_store
+from geo import simplify_geojson
+from snapshot import Snapshot
+from create_app import render_response, page_callbacks, render_comparison
+
+input_names = {
+    'daily': 'state_wise_daily.csv',
+    'vaccine': 'cowin_vaccine_data_statewise.csv',
+    'population': 'population.csv',
+    'geojson': 'states_india.geojson',
+}
+
+# (dates, regions) multipliers applied to the bundled csvs
+datasets = {
+    'bundled': (1, 1),
+    'dates_10x': (10, 1),
+    'regions_10x': (1, 10),
+    'dates_100x': (100, 1),
+    'regions_100x': (1, 100),
+}
+
+# Columns of state_wise_daily.csv that clean_raw_data drops or folds into another state
+non_state_codes = ['Date', 'Date_YMD', 'Status', 'TT', 'UN', 'DD', 'LA']
+
+
+def make_synthetic_inputs(n_days, n_regions, seed=0):
+    # Inputs shaped like the cleaned state_wise_daily.csv, population.csv and the daily CoWIN numbers
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2020-03-14', periods=n_days)
+    regions = [f'Region {i:04d}' for i in range(n_regions)]
+
+    # Case counts ramp up from zero so the early days have the same 0/0 and x/0 gaps as the real data
+    scale = np.linspace(0, 1000, n_days)[:, None] * rng.uniform(0.1, 2, n_regions)
+    confirmed = rng.poisson(scale)
+    rows = {
+        'Confirmed': confirmed,
+        'Deceased': rng.binomial(confirmed, 0.015),
+        'Recovered': rng.binomial(confirmed, 0.9),
+    }
+    df = pd.concat([
+        pd.concat([pd.DataFrame({'Date': dates, 'Status': status}), pd.DataFrame(values, columns=regions)], axis=1)
+        for status, values in rows.items()
+    ]).sort_values('Date', kind='stable').reset_index(drop=True)
+
+    state_population_df = pd.DataFrame({'state': regions, 'population': rng.integers(10 ** 5, 10 ** 8, n_regions)})
+
+    vaccine_dates = dates[n_days // 3:]
+    first_doses = rng.poisson(500, (len(vaccine_dates), n_regions)).astype(float)
+    second_doses = rng.poisson(200, (len(vaccine_dates), n_regions)).astype(float)
+    vaccine_df = pd.DataFrame({
+        'Date': np.repeat(vaccine_dates, n_regions),
+        'state': np.tile(regions, len(vaccine_dates)),
+        'vaccinations': (first_doses + second_doses).ravel(),
+        'first_doses': first_doses.ravel(),
+        'second_doses': second_doses.ravel(),
+    })
+    return df, state_population_df, vaccine_df
+
+
+def write_scaled_inputs(data_dir, dates_scale, regions_scale):
+    # The bundled inputs repeated back to back in time and copied under new region names, written as raw files
+    # so every stage, csv parsing included, runs exactly as it does on the real data
+    daily_df = pd.read_csv(input_names['daily'])
+    raw_vaccine_df = pd.read_csv(input_names['vaccine'])
+    population_df = pd.read_csv(input_names['population'])
+    with open(input_names['geojson'], 'r') as f:
+        geojson = json.load(f)
+
+    daily_dates = pd.to_datetime(daily_df['Date_YMD'], format='%Y-%m-%d')
+    vaccine_dates = pd.to_datetime(raw_vaccine_df['Updated On'], format='%d/%m/%Y')
+    span = timedelta(days=(daily_dates.max() - daily_dates.min()).days + 1)
+    last_doses = raw_vaccine_df.groupby('State')[dose_columns].transform('last')
+
+    daily_copies, vaccine_copies = [], []
+    for i in range(dates_scale):
+        copy_df = daily_df.copy()
+        copy_df['Date_YMD'] = (daily_dates + i * span).dt.strftime('%Y-%m-%d')
+        copy_df['Date'] = (daily_dates + i * span).dt.strftime('%d-%b-%y')
+        daily_copies.append(copy_df)
+        copy_df = raw_vaccine_df.copy()
+        copy_df['Updated On'] = (vaccine_dates + i * span).dt.strftime('%d/%m/%Y')
+        # Cumulative counts keep growing so the daily deltas stay the bundled ones
+        copy_df[dose_columns] += i * last_doses
+        vaccine_copies.append(copy_df)
+    daily_df = pd.concat(daily_copies, ignore_index=True)
+    raw_vaccine_df = pd.concat(vaccine_copies, ignore_index=True)
+
+    state_codes = [code for code in daily_df.columns if code not in non_state_codes]
+    state_vaccine_df = raw_vaccine_df[raw_vaccine_df['State'] != 'India']
+    daily_columns, vaccine_copies, population_copies, features = {}, [raw_vaccine_df], [population_df], []
+    for j in range(1, regions_scale):
+        for code in state_codes:
+            daily_columns[f'{state_abbreviations_dict.get(code, code)} {j}'] = daily_df[code]
+        vaccine_copies.append(state_vaccine_df.assign(State=state_vaccine_df['State'] + f' {j}'))
+        population_copies.append(population_df.assign(state=population_df['state'] + f' {j}'))
+        for feature in geojson['features']:
+            properties = dict(feature['properties'], state_code=feature['properties']['state_code'] + 100 * j,
+                              st_nm=f"{feature['properties']['st_nm']} {j}")
+            features.append(dict(feature, properties=properties))
+    daily_df = pd.concat([daily_df, pd.DataFrame(daily_columns)], axis=1)
+    raw_vaccine_df = pd.concat(vaccine_copies, ignore_index=True)
+    population_df = pd.concat(population_copies, ignore_index=True)
+    geojson = dict(geojson, features=geojson['features'] + features)
+
+    daily_df.to_csv(os.path.join(data_dir, input_names['daily']), index=False)
+    raw_vaccine_df.to_csv(os.path.join(data_dir, input_names['vaccine']), index=False)
+    population_df.to_csv(os.path.join(data_dir, input_names['population']), index=False)
+    with open(os.path.join(data_dir, input_names['geojson']), 'w') as f:
+        json.dump(geojson, f)
+
+
+def measure(func, *args, repeat=3):
+    # Best of `repeat` plain runs, then one traced run for the peak memory allocated while func runs
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'seconds': min(timings), 'runs': timings, 'peak_memory_bytes': peak}, result
+
+
+def load_vaccine_data_uncached(path):
+    cowin_df = read_cowin_csv(path)
+    return get_daily_vaccinations_df(cowin_df), get_vaccine_cumulative_df(cowin_df)
+
+
+def get_state_metrics(df, vaccine_df, state_population_df):
+    return get_modified_state_metrics_df(get_state_metrics_df(df, vaccine_df, state_population_df))
+
+
+def load_geojson(path):
+    with open(path, 'r') as f:
+        return simplify_geojson(modify_geojson(json.load(f)))
+
+
+def benchmark_stages(data_dir, repeat):
+    paths = {name: os.path.join(data_dir, file_name) for name, file_name in input_names.items()}
+    columnar.parse_cache_dir = os.path.join(data_dir, 'cache')
+    stages = {}
+
+    stages['read_daily_csv'], raw_df = measure(read_daily_csv, paths['daily'], repeat=repeat)
+    load_daily_df(paths['daily'])
+    stages['daily_load_cached'], raw_df = measure(load_daily_df, paths['daily'], repeat=repeat)
+    stages['clean_raw_data'], df = measure(lambda: clean_raw_data(raw_df.copy()), repeat=repeat)
+    stages['vaccine_load'], _ = measure(load_vaccine_data_uncached, paths['vaccine'], repeat=repeat)
+    load_cowin_df(paths['vaccine'])
+    stages['vaccine_load_cached'], (vaccine_df, vaccine_cumulative_df) = measure(load_vaccine_data, paths['vaccine'],
+                                                                                  repeat=repeat)
+    state_population_df = pd.read_csv(paths['population'])
+    stages['get_india_df'], india_df = measure(get_india_df, df, vaccine_df, repeat=repeat)
+    stages['get_state_metrics_df'], state_metrics_df = measure(get_state_metrics, df, vaccine_df,
+                                                               state_population_df, repeat=repeat)
+    stages['get_date_wise_metrics'], date_wise_metrics = measure(get_date_wise_metrics, df, state_population_df,
+                                                                 vaccine_df, repeat=repeat)
+    stages['window_stats'], _ = measure(build_series_store, india_df, date_wise_metrics, repeat=repeat)
+    stages['modify_geojson'], india_geojson = measure(load_geojson, paths['geojson'], repeat=repeat)
+
+    frames = {
+        'india_df': india_df,
+        'state_metrics_df': state_metrics_df,
+        'district_metrics_df': pd.DataFrame(),
+        'date_wise_metrics': date_wise_metrics,
+        'vaccine_cumulative_df': vaccine_cumulative_df,
+        'pending_vaccine_df': vaccine_df[vaccine_df['Date'] > df['Date'].max()].reset_index(drop=True),
+        'india_geojson': india_geojson,
+    }
+    stages['snapshot'], snapshot = measure(Snapshot, 'benchmark', frames, repeat=repeat)
+    shape = {'days': len(date_wise_metrics), 'regions': len(date_wise_metrics['Confirmed'].columns),
+             'daily_rows': len(raw_df)}
+    return shape, stages, snapshot
+
+
+def summarize(timings):
+    seconds = np.array(list(timings.values()))
+    return {
+        'count': len(seconds),
+        'total_seconds': seconds.sum(),
+        'mean_seconds': seconds.mean(),
+        'p50_seconds': np.percentile(seconds, 50),
+        'p95_seconds': np.percentile(seconds, 95),
+        'max_seconds': seconds.max(),
+        'slowest': max(timings, key=timings.get),
+    }
+
+
+def render_page(snapshot, state_name):
+    return [render_response(snapshot, state_name, callback_name) for callback_name in page_callbacks]
+
+
+def benchmark_render(snapshot, repeat, max_states=None):
+    # Per callback, the KPI one is what the user sees first, the page total is what a worker spends on a click
+    states = [state for state in snapshot.state_metrics_df.index if state != 'India'][:max_states]
+    india = {callback_name: measure(render_response, snapshot, 'India', callback_name, repeat=repeat)[0]
+             for callback_name in page_callbacks}
+    india['page'], responses = measure(render_page, snapshot, 'India', repeat=repeat)
+
+    timings = {callback_name: {} for callback_name in list(page_callbacks) + ['page']}
+    for state in states:
+        for callback_name in page_callbacks:
+            start = time.perf_counter()
+            render_response(snapshot, state, callback_name)
+            timings[callback_name][state] = time.perf_counter() - start
+        timings['page'][state] = sum(timings[callback_name][state] for callback_name in page_callbacks)
+    state_stats = {callback_name: summarize(callback_timings) for callback_name, callback_timings in timings.items()}
+    # One click at a time is what a worker holds in memory, so the peak is taken from the slowest one
+    slowest_peak, _ = measure(render_page, snapshot, state_stats['page']['slowest'], repeat=1)
+    state_stats['page']['peak_memory_bytes'] = slowest_peak['peak_memory_bytes']
+
+    return {
+        'India': india,
+        'states': state_stats,
+        'response_bytes': dict(zip(page_callbacks, map(len, responses))),
+    }
+
+
+def benchmark_comparison(snapshot, repeat):
+    # One batched figure per request, so the time should barely move from one state to all of them
+    states = [region for region in snapshot.series.regions if region != 'India']
+    timings = {}
+    for layout in ['overlay', 'small_multiples']:
+        for n_states in sorted({1, min(10, len(states)), len(states)}):
+            timings[f'{layout}_{n_states}'], _ = measure(render_comparison, snapshot, states[:n_states], 'Confirmed',
+                                                         moving_avg_days, layout, repeat=repeat)
+    return timings
+
+
+def benchmark_dataset(name, repeat, max_states=None):
+    dates_scale, regions_scale = datasets[name]
+    with tempfile.TemporaryDirectory(prefix=f'benchmark-{name}-') as data_dir:
+        write_scaled_inputs(data_dir, dates_scale, regions_scale)
+        shape, stages, snapshot = benchmark_stages(data_dir, repeat)
+    render = benchmark_render(snapshot, repeat, max_states)
+    return {'dates_scale': dates_scale, 'regions_scale': regions_scale, 'shape': shape, 'stages': stages,
+            'render_page_content': render, 'comparison': benchmark_comparison(snapshot, repeat)}
+
+
+def get_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(names, repeat, max_states=None):
+    results = {
+        'commit': get_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'repeat': repeat,
+        'datasets': {},
+    }
+    for name in names:
+        print(f'Benchmarking {name}', file=sys.stderr)
+        results['datasets'][name] = benchmark_dataset(name, repeat, max_states)
+    # ru_maxrss is in kilobytes on Linux
+    results['max_rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return results
+
+
+def benchmark_date_wise_engines(n_days, n_regions):
+    inputs = make_synthetic_inputs(n_days, n_regions)
+    pandas_stats, expected = measure(get_date_wise_metrics_pandas, *inputs, repeat=1)
+    numpy_stats, result = measure(get_date_wise_metrics, *inputs)
+    pd.testing.assert_frame_equal(result, expected, check_exact=True)
+    return {'days': n_days, 'regions': n_regions, 'pandas': pandas_stats, 'numpy': numpy_stats,
+            'speedup': pandas_stats['seconds'] / numpy_stats['seconds']}
+
+
+def make_synthetic_districts(n_days, n_districts, districts_per_state=20, seed=0):
+    # Cumulative counts shaped like covid19india's districts.csv plus a population per district
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2020-04-26', periods=n_days)
+    districts = [f'District {i:04d}' for i in range(n_districts)]
+    states = [f'State {i // districts_per_state:03d}' for i in range(n_districts)]
+    confirmed = rng.poisson(np.linspace(0, 1000, n_days)[:, None] * rng.uniform(0.1, 2, n_districts)).cumsum(axis=0)
+    districts_df = pd.DataFrame({
+        'Date': np.repeat(dates, n_districts),
+        'State': pd.Categorical(np.tile(states, n_days)),
+        'District': pd.Categorical(np.tile(districts, n_days)),
+        'Confirmed': confirmed.ravel().astype(float),
+        'Recovered': (confirmed * 0.9).round().ravel(),
+        'Deceased': (confirmed * 0.015).round().ravel(),
+    })
+    district_population_df = pd.DataFrame({'state': states, 'district': districts,
+                                           'population': rng.integers(10 ** 5, 10 ** 7, n_districts)})
+    return districts_df, district_population_df
+
+
+def benchmark_district_metrics(n_days, n_districts):
+    stats, district_metrics_df = measure(get_district_metrics_df, *make_synthetic_districts(n_days, n_districts))
+    return {'days': n_days, 'districts': len(district_metrics_df), 'get_district_metrics_df': stats}
+
+
+def to_json(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+if __name__ == '__main__':
+    # python benchmark.py --output before.json, then diff it against a run on another commit
+    parser = argparse.ArgumentParser(description='Time the ETL stages and the page callback')
+    parser.add_argument('--datasets', nargs='+', choices=list(datasets), default=list(datasets))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--max-states', type=int, default=None, help='render only the first N states')
+    parser.add_argument('--date-wise-engines', nargs=2, type=int, metavar=('DAYS', 'REGIONS'),
+                        help='compare the pandas and numpy date wise engines on synthetic data instead')
+    parser.add_argument('--districts', nargs=2, type=int, metavar=('DAYS', 'DISTRICTS'),
+                        help='time the district totals and their roll up on synthetic data instead')
+    parser.add_argument('--output', help='write the JSON here instead of stdout')
+    args = parser.parse_args()
+
+    if args.date_wise_engines:
+        results = benchmark_date_wise_engines(*args.date_wise_engines)
+    elif args.districts:
+        results = benchmark_district_metrics(*args.districts)
+    else:
+        results = run_suite(args.datasets, args.repeat, args.max_states)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, default=to_json)
+    else:
+        print(json.dumps(results, indent=2, default=to_json))
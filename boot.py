@@ -0,0 +1,101 @@
+import json
+import logging
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from config import liveness_path, readiness_path
+
+# Only the standard library and config, so a server exists before pandas, plotly or dash are imported
+
+logger = logging.getLogger(__name__)
+
+# Seconds a client is told to wait before asking again while the dashboard warms up
+retry_after_seconds = 2
+
+warming_up_page = f'''<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><meta http-equiv="refresh" content="{retry_after_seconds}"><title>Covid Dashboard</title></head>
+<body style="font-family: sans-serif; text-align: center; padding-top: 20vh;">
+<h3>The dashboard is warming up</h3><p>This page reloads by itself in a moment.</p>
+</body>
+</html>'''
+
+
+class Boot:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.app = None
+        self.error = None
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        yield
+        self.phases[name] = time.perf_counter() - start
+        logger.info('Boot phase %s took %.3fs', name, self.phases[name])
+
+    def run(self, build):
+        # build(phase) imports, loads and builds whatever it times under phase(name) and returns the Dash app
+        app = build(self.phase)
+        self.phases['total'] = time.perf_counter() - self.started
+        logger.info('Dashboard ready %.3fs after boot started', self.phases['total'])
+        self.app = app
+        return app
+
+    def run_in_background(self, build):
+        def warm_up():
+            try:
+                self.run(build)
+            except Exception:
+                self.error = traceback.format_exc()
+                logger.exception('Dashboard warm-up failed')
+
+        threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+
+    def get_liveness(self):
+        if self.error is not None:
+            return '500 Internal Server Error', {'status': 'failed'}
+        return '200 OK', {'status': 'alive'}
+
+    def get_readiness(self):
+        if self.error is not None:
+            return '503 Service Unavailable', {'status': 'failed'}
+        if self.app is None:
+            return '503 Service Unavailable', {'status': 'warming up',
+                                               'seconds': time.perf_counter() - self.started,
+                                               'phases': dict(self.phases)}
+        return '200 OK', {'status': 'ready', 'phases': self.phases}
+
+
+class BootServer:
+    # WSGI app that answers the liveness and readiness checks itself and hands everything else to wsgi_app, or to the
+    # server of the Dash app boot built. A small 503 goes back until there is one
+    def __init__(self, boot, wsgi_app=None):
+        self.boot = boot
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if path == liveness_path:
+            return self.respond(start_response, *self.boot.get_liveness())
+        if path == readiness_path:
+            return self.respond(start_response, *self.boot.get_readiness())
+        if self.wsgi_app is not None:
+            return self.wsgi_app(environ, start_response)
+        app = self.boot.app
+        if app is not None:
+            return app.server(environ, start_response)
+        status, body = self.boot.get_readiness()
+        headers = [('Retry-After', str(retry_after_seconds))]
+        if 'text/html' in environ.get('HTTP_ACCEPT', ''):
+            return self.respond(start_response, status, warming_up_page, 'text/html; charset=utf-8', headers)
+        return self.respond(start_response, status, {'status': body['status']}, headers=headers)
+
+    @staticmethod
+    def respond(start_response, status, body, content_type='application/json', headers=()):
+        data = (json.dumps(body) if content_type == 'application/json' else body).encode()
+        start_response(status, [('Content-Type', content_type), ('Content-Length', str(len(data))),
+                                ('Cache-Control', 'no-store'), *headers])
+        return [data]
@@ -0,0 +1,24 @@
+import logging
+from artifacts import has_artifacts, get_input_hash
+from config import log_level, refresh_interval
+from snapshot import watch_inputs, build_settled_artifacts
+
+# Started by the gunicorn master (gunicorn.conf.py) when it preloads the app: the one process that builds new
+# artifacts while the workers only map them. It holds the build lock while it builds, like any other builder
+
+logger = logging.getLogger(__name__)
+
+
+def build(interval=refresh_interval):
+    # True once the current inputs have artifacts, False while they settle or another process builds them
+    if has_artifacts(get_input_hash()):
+        return True
+    built = build_settled_artifacts(interval)
+    if built is not None:
+        logger.info('Built artifacts %s', built[0])
+    return built is not None
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(name)s: %(message)s', level=log_level)
+    watch_inputs(refresh_interval, build)
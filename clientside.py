@@ -0,0 +1,40 @@
+import numpy as np
+from config import moving_avg_days
+
+# Series are stored as value * scale rounded to integers and delta encoded. The plotted counts are moving averages of
+# whole numbers, so scaling by the window gives back the exact rolling sums, rates keep eight decimals
+plotted_metrics = {
+    'vaccinations': moving_avg_days,
+    'Confirmed': moving_avg_days,
+    'case_fatality_rate': 10 ** 8,
+    'Deceased': moving_avg_days,
+}
+
+
+def encode_dates(index):
+    # Consecutive days only need the first one and a count
+    days = index.values.astype('datetime64[D]')
+    if len(days) and (np.diff(days).astype(int) == 1).all():
+        return {'start': str(days[0]), 'days': len(days)}
+    return [str(day) for day in days]
+
+
+def encode_series(values, scale):
+    # Gaps stay null, every other entry is the step from the previous non-null value
+    values = np.asarray(values, dtype=float)
+    present = ~np.isnan(values)
+    quantized = np.round(values[present] * scale).astype(np.int64)
+    deltas = np.diff(quantized, prepend=0).tolist()
+    encoded = [None] * len(values)
+    for position, delta in zip(np.flatnonzero(present).tolist(), deltas):
+        encoded[position] = delta
+    return encoded
+
+
+def get_series_data(series_store, window=moving_avg_days):
+    series = {}
+    for metric, scale in plotted_metrics.items():
+        values = series_store.metric_values(metric, window)
+        regions = {region: encode_series(values[code], scale) for region, code in series_store.regions.items()}
+        series[metric] = {'scale': scale, 'regions': regions}
+    return {'dates': encode_dates(series_store.dates), 'series': series}
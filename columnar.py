@@ -0,0 +1,96 @@
+import hashlib
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from config import parse_cache_dir
+from shared import frame_from_blocks
+from metrics import timed
+
+# Bump whenever a reader's output (pruned columns, dtypes) or the file layout changes
+columnar_format_version = 1
+
+
+def get_columnar_path(path, kind):
+    stat = os.stat(path)
+    key = f'{columnar_format_version}:{os.path.abspath(path)}:{stat.st_mtime_ns}:{stat.st_size}'
+    return os.path.join(parse_cache_dir, f'{kind}-{hashlib.sha256(key.encode()).hexdigest()[:16]}.npz')
+
+
+def save_columnar(df, cache_path, kind):
+    # Columns of one dtype are stacked into a single (n_columns, n_rows) block, categoricals are stored as codes plus
+    # categories. Readers only hand over numeric, datetime and categorical columns, so nothing needs pickling
+    arrays = {'columns': np.array(df.columns, dtype=str)}
+    block_positions = {}
+    for position, column in enumerate(df.columns):
+        values = df.iloc[:, position]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            arrays[f'codes_{position}'] = values.cat.codes.to_numpy()
+            arrays[f'categories_{position}'] = values.cat.categories.to_numpy(dtype=str)
+        else:
+            block_positions.setdefault(values.dtype.str, []).append(position)
+    for number, positions in enumerate(block_positions.values()):
+        arrays[f'positions_{number}'] = np.array(positions)
+        arrays[f'block_{number}'] = np.stack([df.iloc[:, position].to_numpy() for position in positions])
+
+    os.makedirs(parse_cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f'.{kind}-', suffix='.npz', dir=parse_cache_dir)
+    with os.fdopen(fd, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, cache_path)
+    for entry in os.listdir(parse_cache_dir):
+        if entry.startswith(f'{kind}-') and entry != os.path.basename(cache_path):
+            os.remove(os.path.join(parse_cache_dir, entry))
+
+
+@timed
+def load_columnar(cache_path):
+    with np.load(cache_path) as cached:
+        columns = cached['columns'].tolist()
+        categoricals = {}
+        blocks = []
+        for name in cached.files:
+            if name.startswith('codes_'):
+                position = int(name[len('codes_'):])
+                categoricals[position] = pd.Categorical.from_codes(cached[name],
+                                                                   cached[f'categories_{position}'].astype(object))
+            elif name.startswith('block_'):
+                blocks.append((cached[f'positions_{name[len("block_"):]}'].tolist(), cached[name]))
+
+    # The blocks become the frame as they are, the categoricals are slotted back in at their positions
+    plain_positions = [position for position in range(len(columns)) if position not in categoricals]
+    renumbered = {position: number for number, position in enumerate(plain_positions)}
+    n_rows = len(next(iter(categoricals.values()))) if categoricals else blocks[0][1].shape[1]
+    df = frame_from_blocks([([renumbered[position] for position in positions], values) for positions, values in blocks],
+                           pd.RangeIndex(n_rows), pd.Index([columns[position] for position in plain_positions]))
+    for position in sorted(categoricals):
+        df.insert(position, columns[position], categoricals[position])
+    return df
+
+
+def load_or_convert(path, kind, read):
+    # read parses the csv into typed, column pruned form, its output is kept next to the other parses in
+    # parse_cache_dir until the csv changes
+    cache_path = get_columnar_path(path, kind)
+    if os.path.exists(cache_path):
+        return load_columnar(cache_path)
+    df = read(path)
+    try:
+        save_columnar(df, cache_path, kind)
+    except OSError:
+        # Read-only filesystem, the parse just isn't reused
+        pass
+    return df
+
+
+def convert_inputs():
+    from helper import load_daily_df
+    from vaccine import load_cowin_df
+
+    load_daily_df('state_wise_daily.csv')
+    load_cowin_df('cowin_vaccine_data_statewise.csv')
+
+
+if __name__ == '__main__':
+    # Run at build / deploy time so the first start doesn't parse the csvs
+    convert_inputs()
@@ -2,4 +2,96 @@ import os
 
 in_production = os.getenv('GAE_ENV', '').startswith('standard')
 
-avg_days_to_death = 15
\ No newline at end of file
+avg_days_to_death = 15
+
+moving_avg_days = 7
+
+# Every window listed here is precomputed for India and the states whenever a snapshot is loaded
+moving_avg_windows = [moving_avg_days, 14, 28]
+
+plot_start_date = '2020-07-01'
+
+# Douglas-Peucker tolerance (degrees) and decimals kept when the map geometry is simplified at build time
+geojson_tolerance = float(os.getenv('GEOJSON_TOLERANCE', '0.01'))
+geojson_precision = int(os.getenv('GEOJSON_PRECISION', '3'))
+
+artifacts_dir = os.getenv('ARTIFACTS_DIR', 'artifacts')
+
+# Set by the Procfile when gunicorn runs with --preload, the master shares the frames with every worker
+preload_shared = os.getenv('PRELOAD_SHARED', '') == '1'
+
+# Hand gunicorn a server as soon as main is imported and build the dashboard in a background thread, it answers with
+# a small 503 until then. Ignored with PRELOAD_SHARED, the master has to build everything before it forks. The
+# liveness and readiness checks are answered in both modes
+lazy_boot = os.getenv('LAZY_BOOT', '') == '1'
+liveness_path = os.getenv('LIVENESS_PATH', '/healthz')
+readiness_path = os.getenv('READINESS_PATH', '/readyz')
+
+# Level of the app's own logs (boot timings, refreshes, pipeline reports), written through gunicorn's error log when
+# running under it
+log_level = os.getenv('LOG_LEVEL', 'INFO').upper()
+
+# Seconds between checks of the input files / artifact store for new data, 0 turns hot reload off. Nothing is built
+# from an input written to within the last interval, it may still be being written
+refresh_interval = int(os.getenv('REFRESH_INTERVAL', '60'))
+
+input_files = [
+    'state_wise_daily.csv',
+    'cowin_vaccine_data_statewise.csv',
+    'population.csv',
+    'states_india.geojson',
+]
+
+# Optional district level inputs: covid19india's districts.csv (Date, State, District and cumulative counts), a
+# population per district (state, district, population) and a geojson whose features carry st_nm and district
+# properties. The map can switch to districts once all of them are there
+district_data_path = os.getenv('DISTRICT_DATA', 'districts.csv')
+district_population_path = os.getenv('DISTRICT_POPULATION', 'district_population.csv')
+district_geojson_path = os.getenv('DISTRICT_GEOJSON', 'districts_india.geojson')
+optional_input_files = [district_data_path, district_population_path, district_geojson_path]
+
+# Where the state and India totals come from: 'state' sums state_wise_daily.csv, 'district' rolls them up from
+# districts.csv in the same pass that ranks the districts, so every level of the map adds up. Vaccine doses (and the
+# population, unless it is known per district) still come from the state inputs, the date wise series always do.
+# Falls back to 'state' without a districts.csv
+region_metrics_source = os.getenv('REGION_METRICS_SOURCE', 'state')
+
+# Rendered callback responses kept per (snapshot version, state, callback), 0 turns the cache off
+render_cache_size = int(os.getenv('RENDER_CACHE_SIZE', '512'))
+
+# Render every state's response when a snapshot is swapped in instead of on its first click
+prerender_responses = os.getenv('PRERENDER', '') == '1'
+
+# 'numpy' computes the per state date wise metrics on (date x state) arrays, 'pandas' is the original pivot version
+date_wise_engine = os.getenv('DATE_WISE_ENGINE', 'numpy')
+
+# 'thread' runs the independent load and transform steps of the pipeline concurrently, 'serial' runs them one after
+# another
+pipeline_executor = os.getenv('PIPELINE_EXECUTOR', 'thread')
+pipeline_workers = int(os.getenv('PIPELINE_WORKERS', str(os.cpu_count() or 1)))
+
+# Typed, column pruned parses of the raw csvs are kept here, keyed by the file's mtime and size
+parse_cache_dir = os.getenv('PARSE_CACHE_DIR', 'cache')
+
+# Rows per chunk when streaming the CoWIN dump
+cowin_chunk_rows = int(os.getenv('COWIN_CHUNK_ROWS', '100000'))
+
+# Opt-in timing histograms for pipeline steps, component builders and callbacks, served at metrics_path
+metrics_enabled = os.getenv('METRICS', '') == '1'
+metrics_path = os.getenv('METRICS_PATH', '/metrics')
+
+# Ship every plotted series with the layout and switch states in the browser instead of calling the server
+clientside_rendering = os.getenv('CLIENTSIDE', '') == '1'
+
+# Points per plotted series, picked per snapshot by largest triangle three buckets (0 plots every day). Zooming into a
+# plot fetches the full resolution of the visible range
+plot_max_points = int(os.getenv('PLOT_MAX_POINTS', '150'))
+
+# 'orjson' (falls back to 'plotly' when it isn't installed) or 'plotly', the serializer for layouts and callbacks
+json_engine = os.getenv('JSON_ENGINE', 'orjson')
+
+# Read-only JSON / CSV API over the current snapshot, mounted on the dashboard's server ('' leaves it out). Rows per
+# page unless the request asks for fewer, never more than api_max_page_size
+api_prefix = os.getenv('API_PREFIX', '/api/v1')
+api_page_size = int(os.getenv('API_PAGE_SIZE', '1000'))
+api_max_page_size = int(os.getenv('API_MAX_PAGE_SIZE', '10000'))
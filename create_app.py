@@ -1,10 +1,26 @@
+import json
+import time
+from collections import OrderedDict
 import dash
+import flask
 import dash_bootstrap_components as dbc
 import dash_core_components as dcc
 import dash_html_components as html
 from dash.dependencies import Input, Output, State
-from helper import state_id_map, print_formatted, print_delta, fix_name
-from graph import get_date_wise_plot, get_choropleth, get_india_date_wise_plot
+from dash.exceptions import PreventUpdate
+from helper import state_id_map, fix_name, print_date
+from graph import get_date_wise_plot, get_choropleth, get_choropleth_figure, get_india_date_wise_plot, \
+    get_comparison_figure, get_comparison_plot
+from render_cache import RenderCache
+from clientside import get_series_data
+from kpi_table import kpi_metrics
+from downsample import get_range_rows, get_series_rows
+from http_cache import get_etag, get_encoded_etag, get_matching_etag
+from serialize import dumps
+from api import create_api
+from config import render_cache_size, prerender_responses, metrics_enabled, metrics_path, clientside_rendering, \
+    api_prefix, moving_avg_days, plot_max_points
+from metrics import timed, render_metrics, callback_seconds, response_bytes
 
 reverse_state_id_map = {v: k for k, v in state_id_map.items()}
 
@@ -17,32 +33,69 @@ tooltip_text = {
 
 card_body_style = {'textAlign': 'center', 'padding': '0.5vh'}
 
+map_level_labels = {'state': 'States', 'district': 'Districts'}
 
-def generate_kpi_card_body(click_data, metric, state_metrics_df):
-    if not click_data:
-        state_name = 'India'
-        result = state_metrics_df.loc[state_name, metric]
-        vs_national_avg = html.H3('-', style={'color': 'white', 'font-size': '4.5vh'})
-        rank = html.H6('-', style={'color': 'white', 'font-size': '2.5vh'})
+plot_cards = {
+    'vaccinations': 'vaccinations_plot_card',
+    'Confirmed': 'confirmed_plot_card',
+    'case_fatality_rate': 'case_fatality_rate_plot_card',
+    'Deceased': 'deaths_plot_card',
+}
+
+# Runs in the browser, so a click only costs the requests for the cards themselves
+select_state_js = """
+function(clickData, nClicks) {
+    const stateNames = %s;
+    const triggered = dash_clientside.callback_context.triggered.map(t => t.prop_id);
+    if (triggered[0] === 'choropleth.clickData' && clickData) {
+        // Below the state level every region carries the state it belongs to
+        const point = clickData.points[0];
+        return point.customdata || stateNames[point.location] || dash_clientside.no_update;
+    }
+    return 'India';
+}
+""" % json.dumps(reverse_state_id_map)
+
+# Metrics the comparison can plot, each in any window or growth stat of the series store
+comparison_metrics = ['Confirmed', 'Deceased', 'vaccinations', 'cases_per_million', 'deaths_per_million',
+                      'case_fatality_rate', 'pct_fully_vaccinated', 'window_case_fatality_rate', 'second_dose_share']
+
+comparison_window_labels = {1: 'Daily', 'week_over_week': 'Week over week growth',
+                            'doubling_days': 'Doubling time (days)'}
+
+comparison_layouts = {'overlay': 'Overlay', 'small_multiples': 'Small multiples'}
+
+# A lasso or box selection on the map, or the all states button, replaces the states being compared
+select_comparison_states_js = """
+function(selectedData, nClicks, options) {
+    const stateNames = %s;
+    const triggered = dash_clientside.callback_context.triggered.map(t => t.prop_id);
+    if (triggered[0] === 'compare_all_button.n_clicks') {
+        return options.map(option => option.value).filter(value => value !== 'India');
+    }
+    if (!selectedData || !selectedData.points.length) {
+        return dash_clientside.no_update;
+    }
+    const states = selectedData.points.map(point => point.customdata || stateNames[point.location]);
+    return Array.from(new Set(states.filter(state => state)));
+}
+""" % json.dumps(reverse_state_id_map)
+
+
+@timed
+def generate_kpi_card_body(state_name, metric, kpi_texts):
+    value, vs_national_avg, color, rank = kpi_texts
+    vs_national_avg = html.H3(vs_national_avg, style={'color': color, 'font-size': '4.5vh'})
+    if state_name == 'India':
+        rank = html.H6(rank, style={'color': 'white', 'font-size': '2.5vh'})
     else:
-        state_id = click_data['points'][0]['location']
-        state_name = reverse_state_id_map[state_id]
-        result = state_metrics_df.loc[state_name, metric]
-        if 'vacci' in metric:
-            color = '#27ae60' if result > state_metrics_df.loc['India', metric] else '#d91e18'
-        else:
-            color = '#d91e18' if result > state_metrics_df.loc['India', metric] else '#27ae60'
-        vs_national_avg = html.H3(
-            f"{print_delta(now=result, prev=state_metrics_df.loc['India', metric])} vs National Avg",
-                                  style={'color': color, 'font-size': '4.5vh'})
-        rank = html.H6(f"Rank : {int(state_metrics_df.loc[state_name, f'{metric}_rank'])} of {state_metrics_df.shape[0] - 1}",
-                       style={'font-size': '2.5vh'})
+        rank = html.H6(rank, style={'font-size': '2.5vh'})
 
     card_body = dbc.CardBody([
                     html.H5(f'{state_name} - {fix_name(metric)}',
                             id=f'kpi_{metric}_header',
                             style={"textDecoration": "underline", "cursor": "pointer", 'font-size': '3vh'}),
-                    html.H1(print_formatted(result, metric),
+                    html.H1(value,
                             style={'font-weight': 'bold', 'font-size': '5.2vh', 'margin-bottom': 0}),
                     vs_national_avg,
                     rank,
@@ -54,14 +107,15 @@ def generate_kpi_card_body(click_data, metric, state_metrics_df):
     return card_body
 
 
-def generate_plot_card_body(click_data, metric, india_df, date_wise_metrics):
-    if not click_data:
-        state_name = 'India'
-        plot = get_india_date_wise_plot(india_df, metric)
-    else:
-        state_id = click_data['points'][0]['location']
-        state_name = reverse_state_id_map[state_id]
-        plot = get_date_wise_plot(date_wise_metrics, state_name, metric)
+def get_plot(state_name, metric, series_store, rows=None, xaxis_range=None):
+    if state_name == 'India':
+        return get_india_date_wise_plot(series_store, metric, rows, xaxis_range)
+    return get_date_wise_plot(series_store, state_name, metric, rows, xaxis_range)
+
+
+@timed
+def generate_plot_card_body(state_name, metric, series_store, rows=None):
+    plot = get_plot(state_name, metric, series_store, rows)
 
     card_body = dbc.CardBody([
         html.H5(f"{state_name} - {fix_name(metric)}", id=f'plot_{metric}_header', style={'font-size': '3vh'}),
@@ -73,10 +127,213 @@ def generate_plot_card_body(click_data, metric, india_df, date_wise_metrics):
     return card_body
 
 
-def create_app(date_wise_metrics, state_metrics_df, india_df, india_geojson):
-    choropleth = get_choropleth(state_metrics_df, india_geojson)
+def render_kpi_cards(snapshot, state_name):
+    kpi_texts = snapshot.kpi_texts[state_name]
+    return [generate_kpi_card_body(state_name, metric, kpi_texts[metric]) for metric in kpi_metrics]
+
+
+def get_downsampled_rows(snapshot, state_name, metric):
+    return snapshot.plot_rows[snapshot.series.metrics[metric], snapshot.series.regions[state_name]]
+
+
+def get_plot_card_renderer(metric):
+    def render_plot_card(snapshot, state_name):
+        rows = get_downsampled_rows(snapshot, state_name, metric)
+        return [generate_plot_card_body(state_name, metric, snapshot.series, rows)]
+    return render_plot_card
+
+
+def get_zoomed_figure(snapshot, state_name, metric, relayout_data):
+    # Zooming in swaps the downsampled series for every day in the visible range, resetting the axes swaps it back
+    relayout_data = relayout_data or {}
+    if 'xaxis.range[0]' in relayout_data and 'xaxis.range[1]' in relayout_data:
+        xaxis_range = [relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']]
+    elif 'xaxis.range' in relayout_data:
+        xaxis_range = relayout_data['xaxis.range']
+    elif relayout_data.get('xaxis.autorange'):
+        xaxis_range = None
+    else:
+        raise PreventUpdate
+
+    if xaxis_range is None:
+        rows = get_downsampled_rows(snapshot, state_name, metric)
+    else:
+        try:
+            rows = get_range_rows(snapshot.series.dates, *xaxis_range)
+        except (TypeError, ValueError):
+            raise PreventUpdate
+    plot = get_plot(state_name, metric, snapshot.series, rows, xaxis_range)
+    return plot.figure
+
+
+# Every entry is a separate callback on the selected state, the KPI cards never wait for a figure and the browser
+# fetches the plots in parallel
+page_callbacks = {'kpi_cards': ([Output(f'{metric}_card', 'children') for metric in kpi_metrics], render_kpi_cards)}
+page_callbacks.update({card_id: ([Output(card_id, 'children')], get_plot_card_renderer(metric))
+                       for metric, card_id in plot_cards.items()})
+
+
+# In clientside mode the same callbacks run in the browser, see assets/dashboard.js
+clientside_calls = {'kpi_cards': 'function(stateName, data) { return dash_clientside.dashboard.kpi_cards(stateName, data, %s); }'
+                                 % json.dumps(kpi_metrics)}
+clientside_calls.update({card_id: 'function(stateName, data) { return dash_clientside.dashboard.plot_card(stateName, data, %s); }'
+                                  % json.dumps(metric) for metric, card_id in plot_cards.items()})
+
+
+def get_comparison_window_label(window):
+    return comparison_window_labels.get(window, f'{window} day average')
+
+
+def get_comparison_rows(snapshot, metric, states, window):
+    # The plotted window's days were downsampled with the snapshot, the other stats are downsampled here, every state
+    # in one go
+    series = snapshot.series
+    codes = [series.regions[state] for state in states]
+    if window == moving_avg_days:
+        return snapshot.plot_rows[series.metrics[metric], codes]
+    return get_series_rows(series.dates, series.metric_values(metric, window)[codes], plot_max_points)
+
+
+def check_comparison(snapshot, states, metric, window, layout):
+    # Everything here comes from the browser
+    series = snapshot.series
+    if not isinstance(states, list) or len(states) > len(series.regions) or \
+            not all(isinstance(state, str) and state in series for state in states):
+        raise PreventUpdate
+    if metric not in comparison_metrics or metric not in series.metrics:
+        raise PreventUpdate
+    if not isinstance(window, (int, str)) or window not in series.windows or layout not in comparison_layouts:
+        raise PreventUpdate
+
+
+@timed
+def render_comparison(snapshot, states, metric, window, layout):
+    rows = get_comparison_rows(snapshot, metric, states, window)
+    figure = get_comparison_figure(snapshot.series, metric, states, window, rows, layout == 'small_multiples')
+    return serialize_outputs([Output('comparison_plot', 'figure')], [figure])
+
+
+def check_state_name(snapshot, state_name):
+    # The store is written by the browser, a state without metrics (or anything else) leaves the cards as they are
+    if not isinstance(state_name, str) or state_name not in snapshot.state_metrics_df.index:
+        raise PreventUpdate
+
+
+@timed
+def serialize_outputs(outputs, output_values):
+    # Same payload dash builds for a multi-output callback, so cached strings can be sent back as they are
+    response = {}
+    for output, value in zip(outputs, output_values):
+        response.setdefault(output.component_id, {})[output.component_property] = value
+    return dumps({'response': response, 'multi': True})
+
+
+@timed
+def render_response(snapshot, state_name, callback_name):
+    # Everything an uncached request for one callback costs: its card bodies plus the JSON dash would send back
+    outputs, render = page_callbacks[callback_name]
+    return serialize_outputs(outputs, render(snapshot, state_name))
+
+
+def get_output_id(outputs):
+    # How the renderer names a callback's outputs in its requests
+    if isinstance(outputs, list):
+        return '..' + '...'.join(f'{output.component_id}.{output.component_property}' for output in outputs) + '..'
+    return f'{outputs.component_id}.{outputs.component_property}'
+
+
+def to_json_component(component):
+    return json.loads(dumps(component))
+
+
+def get_card_templates(snapshot):
+    # Card bodies rendered once on the server with the data left out, the browser only swaps in texts and series
+    state_metrics_df = snapshot.state_metrics_df
+    variants = {'India': 'India'}
+    variants.update({'state': state for state in state_metrics_df.index.drop('India', errors='ignore')[:1]})
+    templates = {'kpi': {}, 'plot': {}}
+    for metric in kpi_metrics:
+        templates['kpi'][metric] = {
+            variant: to_json_component(generate_kpi_card_body(state, metric, snapshot.kpi_texts[state][metric]))
+            for variant, state in variants.items()
+        }
+    for metric in plot_cards:
+        templates['plot'][metric] = {}
+        for variant, state in variants.items():
+            card = to_json_component(generate_plot_card_body(state, metric, snapshot.series))
+            trace = card['props']['children'][1]['props']['children']['props']['children']['props']['figure']['data'][0]
+            trace['x'], trace['y'] = [], []
+            templates['plot'][metric][variant] = card
+    return templates
+
+
+@timed
+def get_page_data(snapshot):
+    page_data = get_series_data(snapshot.series)
+    page_data['kpis'] = snapshot.kpi_texts
+    page_data['labels'] = {metric: fix_name(metric) for metric in kpi_metrics + list(plot_cards)}
+    page_data['templates'] = get_card_templates(snapshot)
+    return page_data
+
+
+def get_choropleth_title(level):
+    return f'{map_level_labels[level]} with Deaths per million > 250'
+
+
+def get_map_level_responses(snapshot, geojson_urls):
+    # The map's figure and title for every level, switching levels only ever sends one of these back
+    outputs = [Output('choropleth', 'figure'), Output('choropleth_title', 'children')]
+    return {level: serialize_outputs(outputs, [get_choropleth_figure(metrics_df, geojson_urls[level], level),
+                                               get_choropleth_title(level)])
+            for level, (metrics_df, _, _) in snapshot.map_levels.items()}
 
-    app = dash.Dash(external_stylesheets=[dbc.themes.BOOTSTRAP])
+
+def get_comparison_card(snapshot):
+    series = snapshot.series
+    dropdown_style = {'font-size': '1.8vh'}
+    controls = dbc.Row(
+        [
+            dbc.Col(dcc.Dropdown(id='compare_states',
+                                 options=[{'label': region, 'value': region} for region in series.regions],
+                                 value=[],
+                                 multi=True,
+                                 placeholder='Lasso or box select states on the map, or pick them here',
+                                 style=dropdown_style), width=5),
+            dbc.Col(dcc.Dropdown(id='compare_metric',
+                                 options=[{'label': fix_name(metric), 'value': metric}
+                                          for metric in comparison_metrics if metric in series.metrics],
+                                 value='Confirmed',
+                                 clearable=False,
+                                 style=dropdown_style), width=2),
+            dbc.Col(dcc.Dropdown(id='compare_window',
+                                 options=[{'label': get_comparison_window_label(window), 'value': window}
+                                          for window in series.windows],
+                                 value=moving_avg_days,
+                                 clearable=False,
+                                 style=dropdown_style), width=2),
+            dbc.Col(dcc.RadioItems(id='compare_layout',
+                                   options=[{'label': label, 'value': layout}
+                                            for layout, label in comparison_layouts.items()],
+                                   value='overlay',
+                                   inputStyle={'margin-left': '1vh', 'margin-right': '0.5vh'},
+                                   style={'font-size': '1.8vh'}), width=2),
+            dbc.Col(dbc.Button('All states', id='compare_all_button', style={'font-size': '1.8vh'}), width=1),
+        ],
+        style={'margin': '1vh'}
+    )
+    figure = get_comparison_figure(series, 'Confirmed', [])
+    return dbc.Card(
+        [
+            html.H4('Compare states', style={'textAlign': 'center', 'margin-top': '2vh', 'font-size': '3.5vh'}),
+            controls,
+            get_comparison_plot(figure),
+        ]
+    )
+
+
+@timed
+def build_layout(snapshot, geojson_url, page_data=None):
+    choropleth = get_choropleth(snapshot.state_metrics_df, geojson_url)
 
     card_style = {'margin-bottom': '2vh', 'padding-bottom': '0vh', 'height': '22vh'}
 
@@ -122,11 +379,22 @@ def create_app(date_wise_metrics, state_metrics_df, india_df, india_geojson):
      }
     button = dbc.Button('Show overall', id='india_button', style=button_style)
 
+    map_level = []
+    if len(snapshot.map_levels) > 1:
+        map_level = [dcc.RadioItems(id='map_level',
+                                    options=[{'label': map_level_labels[level], 'value': level}
+                                             for level in snapshot.map_levels],
+                                    value='state',
+                                    inputStyle={'margin-left': '1vh', 'margin-right': '0.5vh'},
+                                    style={'textAlign': 'center', 'font-size': '2vh'})]
+
     choropleth_card = dbc.Card(
         [
-            html.H4('States with Deaths per million > 250',
+            html.H4(get_choropleth_title('state'),
+                    id='choropleth_title',
                     style={'textAlign': 'center', 'margin-top': '2vh', 'font-size': '3.5vh'}
                     ),
+            *map_level,
             choropleth,
             button
         ],
@@ -137,6 +405,8 @@ def create_app(date_wise_metrics, state_metrics_df, india_df, india_geojson):
 
     body = html.Div(
         [
+            dcc.Store(id='selected_state'),
+            dcc.Store(id='page_data', data=page_data),
             dbc.Row(
                 [
                     dbc.Col(kpi_cards, width=4),
@@ -147,11 +417,16 @@ def create_app(date_wise_metrics, state_metrics_df, india_df, india_geojson):
             dbc.Row(
                 [
                     dbc.Col(
-                        html.P("Data last updated on 4th June 2021", style={'text-align': 'right'}),
+                        html.P(f"Data last updated on {print_date(snapshot.last_updated)}", style={'text-align': 'right'}),
                         width={"size": 4, "order": "last", "offset": 8}
                     ),
                 ]
             ),
+            dbc.Row(
+                [
+                    dbc.Col(get_comparison_card(snapshot), width=12),
+                ]
+            ),
             html.Br(),
             html.Br(),
             html.Br(),
@@ -160,47 +435,213 @@ def create_app(date_wise_metrics, state_metrics_df, india_df, india_geojson):
         style={'margin': '2vh'}
     )
 
-    app.layout = html.Div(
+    layout = html.Div(
                         [
                             body
                         ]
                 )
 
-    @app.callback(
-        [
-            Output("pct_fully_vaccinated_card", "children"),
-            Output("cases_per_million_card", "children"),
-            Output("case_fatality_rate_card", "children"),
-            Output("deaths_per_million_card", "children"),
-            Output("vaccinations_plot_card", "children"),
-            Output("confirmed_plot_card", "children"),
-            Output("case_fatality_rate_plot_card", "children"),
-            Output("deaths_plot_card", "children"),
-         ],
+    return layout
+
+
+def create_app(snapshot_store, render_cache=None):
+    if render_cache is None:
+        render_cache = RenderCache()
+
+    # The plots (and their zoom callbacks) only exist once a state's cards are rendered. Layout, callback and API
+    # bodies are compressed by Flask-Compress, the geojson asset is stored compressed already
+    app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP], suppress_callback_exceptions=True,
+                    compress=True)
+
+    layout_route = f"{app.config.routes_pathname_prefix}_dash-layout"
+    callback_route = f"{app.config.routes_pathname_prefix}_dash-update-component"
+
+    # The geometry is fetched by plotly.js from a content hashed url instead of being inlined in every layout,
+    # a few recent versions stay servable for pages that were loaded before a swap
+    geojson_assets = OrderedDict()
+    geojson_route = f"{app.config.routes_pathname_prefix}_geojson/"
+
+    def prepare_layout(snapshot):
+        geojson_urls = {}
+        for level, (_, name, encoded) in snapshot.map_levels.items():
+            geojson_assets[name] = encoded
+            geojson_urls[level] = app.get_relative_path(f"/_geojson/{name}")
+        while len(geojson_assets) > 4 * len(snapshot.map_levels):
+            geojson_assets.popitem(last=False)
+        page_data = get_page_data(snapshot) if clientside_rendering else None
+        snapshot.cache['layout'] = build_layout(snapshot, geojson_urls['state'], page_data)
+        snapshot.cache['map_level_responses'] = get_map_level_responses(snapshot, geojson_urls)
+        snapshot.cache['layout_json'] = dumps(snapshot.cache['layout'])
+
+    @app.server.route(f"{geojson_route}<name>")
+    def serve_geojson(name):
+        encoded = geojson_assets.get(name)
+        if encoded is None:
+            flask.abort(404)
+        accepted = flask.request.accept_encodings
+        encoding = next((e for e in ['br', 'gzip'] if e in encoded and accepted[e]), 'identity')
+        response = flask.Response(encoded[encoding], mimetype='application/json')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        response.set_etag(get_encoded_etag(name, encoding))
+        return response.make_conditional(flask.request)
+
+    # Layouts are built when a snapshot is swapped in, never on the request path
+    snapshot_store.add_preparer(prepare_layout)
+    app.layout = lambda: snapshot_store.get().cache['layout']
+
+    # Dash would encode the layout again on every request. It is the same for every user within a snapshot, so
+    # browsers revalidate it against an ETag of the snapshot version. Callbacks are POSTs nothing revalidates, their
+    # bodies are reused from the render cache instead
+    def serve_layout():
+        snapshot = snapshot_store.get()
+        etag = get_etag(snapshot.version, flask.request.path)
+        matching_etag = get_matching_etag(flask.request.if_none_match, etag)
+        if matching_etag is not None:
+            response = flask.Response(status=304)
+            response.set_etag(matching_etag)
+        else:
+            response = flask.Response(snapshot.cache['layout_json'], mimetype='application/json')
+            response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    app.server.view_functions[layout_route] = serve_layout
+
+    app.clientside_callback(
+        select_state_js,
+        Output('selected_state', 'data'),
         [Input("choropleth", "clickData"), Input("india_button", "n_clicks")]
     )
-    def render_page_content(click_data, _):
-        ctx = dash.callback_context
-        button_id = ctx.triggered[0]['prop_id'].split('.')[0]
-        if button_id == 'choropleth':
-            vaccinations_kpi_card = generate_kpi_card_body(click_data, "pct_fully_vaccinated", state_metrics_df)
-            cases_kpi_card = generate_kpi_card_body(click_data, "cases_per_million", state_metrics_df)
-            cfr_kpi_card = generate_kpi_card_body(click_data, "case_fatality_rate", state_metrics_df)
-            deaths_kpi_card = generate_kpi_card_body(click_data, "deaths_per_million", state_metrics_df)
-            vaccinations_plot_card = generate_plot_card_body(click_data, 'vaccinations', india_df, date_wise_metrics)
-            cases_plot_card = generate_plot_card_body(click_data, 'Confirmed', india_df, date_wise_metrics)
-            cfr_plot_card = generate_plot_card_body(click_data, 'case_fatality_rate', india_df, date_wise_metrics)
-            deaths_plot_card = generate_plot_card_body(click_data, 'Deceased', india_df, date_wise_metrics)
-            return vaccinations_kpi_card, cases_kpi_card, cfr_kpi_card, deaths_kpi_card, vaccinations_plot_card, cases_plot_card, cfr_plot_card, deaths_plot_card
-        else:
-            vaccinations_kpi_card = generate_kpi_card_body(None, "pct_fully_vaccinated", state_metrics_df)
-            cases_kpi_card = generate_kpi_card_body(None, "cases_per_million", state_metrics_df)
-            cfr_kpi_card = generate_kpi_card_body(None, "case_fatality_rate", state_metrics_df)
-            deaths_kpi_card = generate_kpi_card_body(None, "deaths_per_million", state_metrics_df)
-            vaccinations_plot_card = generate_plot_card_body(None, 'vaccinations', india_df, date_wise_metrics)
-            cases_plot_card = generate_plot_card_body(None, 'Confirmed', india_df, date_wise_metrics)
-            cfr_plot_card = generate_plot_card_body(None, 'case_fatality_rate', india_df, date_wise_metrics)
-            deaths_plot_card = generate_plot_card_body(None, 'Deceased', india_df, date_wise_metrics)
-            return vaccinations_kpi_card, cases_kpi_card, cfr_kpi_card, deaths_kpi_card, vaccinations_plot_card, cases_plot_card, cfr_plot_card, deaths_plot_card
-
-    return app
\ No newline at end of file
+
+    app.clientside_callback(
+        select_comparison_states_js,
+        Output('compare_states', 'value'),
+        [Input('choropleth', 'selectedData'), Input('compare_all_button', 'n_clicks')],
+        [State('compare_states', 'options')]
+    )
+
+    # Callbacks on the fast path are registered with dash like any other (its dependency graph, validation and
+    # error handling all apply when it dispatches them), but serve_callback answers their requests with the finished
+    # JSON string their encoded function builds, encoded by our serializer instead of dash's and cached
+    encoded_callbacks = {}
+
+    def add_encoded_callback(outputs, inputs, state, encoded_callback, **kwargs):
+        outputs_list = outputs if isinstance(outputs, list) else [outputs]
+
+        def callback(*args):
+            response = json.loads(encoded_callback(*args))['response']
+            values = [response[output.component_id][output.component_property] for output in outputs_list]
+            return values if isinstance(outputs, list) else values[0]
+
+        app.callback(outputs, inputs, state, **kwargs)(callback)
+        encoded_callbacks[get_output_id(outputs)] = encoded_callback
+
+    dispatch = app.server.view_functions[callback_route]
+
+    def serve_callback():
+        body = flask.request.get_json(silent=True) or {}
+        encoded_callback = encoded_callbacks.get(body.get('output'))
+        if encoded_callback is None:
+            return dispatch()
+        # A PreventUpdate gets the 204 of the handler dash registers for its own dispatch
+        args = [item.get('value') if isinstance(item, dict) else None
+                for item in body.get('inputs', []) + body.get('state', [])]
+        return flask.Response(encoded_callback(*args), mimetype='application/json')
+
+    app.server.view_functions[callback_route] = serve_callback
+
+    # Server rendered in every mode, any set of states is one batched figure, cached like the cards
+    def compare_states(states, metric, window, layout):
+        snapshot = snapshot_store.get()
+        check_comparison(snapshot, states, metric, window, layout)
+        if not render_cache_size:
+            return render_comparison(snapshot, states, metric, window, layout)
+        return render_cache.get_or_render((snapshot.version, tuple(states), 'comparison', metric, window, layout),
+                                          lambda: render_comparison(snapshot, states, metric, window, layout))
+
+    add_encoded_callback(Output('comparison_plot', 'figure'),
+                         [Input('compare_states', 'value'), Input('compare_metric', 'value'),
+                          Input('compare_window', 'value'), Input('compare_layout', 'value')], [], compare_states,
+                         prevent_initial_call=True)
+
+    # Only in the layout when the snapshot has more than one level, the state map is already in it
+    def switch_map_level(level):
+        responses = snapshot_store.get().cache['map_level_responses']
+        if not isinstance(level, str) or level not in responses:
+            raise PreventUpdate
+        return responses[level]
+
+    add_encoded_callback([Output('choropleth', 'figure'), Output('choropleth_title', 'children')],
+                         [Input('map_level', 'value')], [], switch_map_level, prevent_initial_call=True)
+
+    if clientside_rendering:
+        # Every series ships once with the layout, switching states never reaches the server
+        for callback_name, (outputs, _) in page_callbacks.items():
+            app.clientside_callback(clientside_calls[callback_name], outputs, [Input('selected_state', 'data')],
+                                    [State('page_data', 'data')])
+    else:
+        # The cards are cached per snapshot
+        for callback_name, (outputs, _) in page_callbacks.items():
+            def render_page_callback(state_name, callback_name=callback_name):
+                snapshot = snapshot_store.get()
+                check_state_name(snapshot, state_name)
+                if not render_cache_size:
+                    return render_response(snapshot, state_name, callback_name)
+                return render_cache.get_or_render((snapshot.version, state_name, callback_name),
+                                                  lambda: render_response(snapshot, state_name, callback_name))
+
+            add_encoded_callback(outputs, [Input('selected_state', 'data')], [], render_page_callback)
+
+        if render_cache_size and prerender_responses:
+            def prerender(snapshot):
+                for state_name in snapshot.state_metrics_df.index:
+                    for callback_name in page_callbacks:
+                        render_cache.put((snapshot.version, state_name, callback_name),
+                                         render_response(snapshot, state_name, callback_name))
+
+            snapshot_store.add_preparer(prerender)
+
+        for metric in plot_cards:
+            def zoom_plot(relayout_data, state_name, metric=metric):
+                snapshot = snapshot_store.get()
+                check_state_name(snapshot, state_name)
+                figure = get_zoomed_figure(snapshot, state_name, metric, relayout_data)
+                return serialize_outputs([Output(f'{metric}_plot', 'figure')], [figure])
+
+            add_encoded_callback(Output(f'{metric}_plot', 'figure'), [Input(f'{metric}_plot', 'relayoutData')],
+                                 [State('selected_state', 'data')], zoom_plot)
+
+    if api_prefix:
+        app.server.register_blueprint(create_api(snapshot_store), url_prefix=api_prefix)
+
+    if metrics_enabled:
+        @app.server.before_request
+        def start_timer():
+            flask.g.request_start = time.perf_counter()
+
+        @app.server.after_request
+        def record_callback(response):
+            if flask.request.path == callback_route and response.status_code == 200:
+                output = (flask.request.get_json(silent=True) or {}).get('output', '')
+                callback_seconds.observe(time.perf_counter() - flask.g.request_start, output)
+                response_bytes.observe(len(response.get_data()), output)
+            return response
+
+        @app.server.route(metrics_path)
+        def serve_metrics():
+            stats = render_cache.stats()
+            values = {
+                'dashboard_render_cache_hits_total': ('counter', 'Callback responses served from the render cache.',
+                                                      stats['hits']),
+                'dashboard_render_cache_misses_total': ('counter', 'Callback responses that had to be rendered.',
+                                                        stats['misses']),
+                'dashboard_render_cache_size': ('gauge', 'Responses currently held in the render cache.',
+                                                stats['size']),
+            }
+            return flask.Response(render_metrics(values), mimetype='text/plain; version=0.0.4')
+
+    app.render_cache = render_cache
+    return app
@@ -0,0 +1,95 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from config import pipeline_executor, pipeline_workers
+
+logger = logging.getLogger(__name__)
+
+executors = ['thread', 'serial']
+
+
+def get_step_order(steps):
+    # steps maps a name to (function, names of the steps whose results it takes), topological order or ValueError
+    order, state = [], {}
+
+    def visit(name, path):
+        if name not in steps:
+            raise ValueError(f"Step {path[-1]} takes {name}, which isn't a step")
+        if state.get(name) == 'done':
+            return
+        if state.get(name) == 'visiting':
+            raise ValueError(f"Steps form a cycle: {' -> '.join(path + [name])}")
+        state[name] = 'visiting'
+        for input_name in steps[name][1]:
+            visit(input_name, path + [name])
+        state[name] = 'done'
+        order.append(name)
+
+    for name in steps:
+        visit(name, [])
+    return order
+
+
+def get_critical_path(steps, order, seconds):
+    # Longest chain of dependent steps by their measured time, no schedule finishes in less time than this
+    finish, previous = {}, {}
+    for name in order:
+        inputs = steps[name][1]
+        previous[name] = max(inputs, key=lambda input_name: finish[input_name]) if inputs else None
+        finish[name] = seconds[name] + (finish[previous[name]] if inputs else 0)
+    name = max(order, key=lambda step: finish[step])
+    path = []
+    while name is not None:
+        path.append(name)
+        name = previous[name]
+    return path[::-1]
+
+
+def run_steps(steps, executor=pipeline_executor, max_workers=pipeline_workers):
+    # Every step starts as soon as its inputs are done, with at most max_workers running at once. 'thread' runs them in
+    # a pool of threads, 'serial' runs them one after another in topological order. The first step to fail stops any
+    # more from starting, its exception is raised once the running ones are done
+    if executor not in executors:
+        raise ValueError(f"Pipeline executor must be one of {', '.join(executors)}, not {executor}")
+    order = get_step_order(steps)
+    if executor == 'serial':
+        max_workers = 1
+    results, timings = {}, {}
+    run_start = time.perf_counter()
+
+    def run(name):
+        func, inputs = steps[name]
+        start = time.perf_counter()
+        result = func(*[results[input_name] for input_name in inputs])
+        timings[name] = (start - run_start, time.perf_counter() - run_start)
+        return result
+
+    pending = list(order)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max(max_workers, 1), thread_name_prefix='pipeline') as pool:
+        while pending or running:
+            for name in [name for name in pending
+                         if all(input_name in results for input_name in steps[name][1])]:
+                if len(running) >= max(max_workers, 1):
+                    break
+                pending.remove(name)
+                running[pool.submit(run, name)] = name
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+
+    seconds = {name: end - start for name, (start, end) in timings.items()}
+    critical_path = get_critical_path(steps, order, seconds)
+    report = {
+        'executor': executor,
+        'workers': max_workers,
+        'wall_seconds': time.perf_counter() - run_start,
+        'step_seconds': sum(seconds.values()),
+        'critical_path': critical_path,
+        'critical_path_seconds': sum(seconds[name] for name in critical_path),
+        'steps': {name: {'start': timings[name][0], 'seconds': seconds[name]} for name in order},
+    }
+    logger.info('Pipeline ran %d steps in %.3fs (%.3fs of step time), critical path %s (%.3fs)', len(order),
+                report['wall_seconds'], report['step_seconds'], ' -> '.join(critical_path),
+                report['critical_path_seconds'])
+    return results, report
@@ -1,8 +1,17 @@
 import numpy as np
 import pandas as pd
-from config import avg_days_to_death
+from config import avg_days_to_death, date_wise_engine
+from shared import frame_from_blocks
+from metrics import timed
 
-def get_date_wise_metrics(df, state_population_df, vaccine_df):
+statuses = ['Confirmed', 'Deceased', 'Recovered']
+vaccine_metrics = ['vaccinations', 'first_doses', 'second_doses']
+# Column order of the pivot based engine, raw metrics sorted by name, derived metrics grouped per state
+raw_metrics = ['Confirmed', 'Deceased', 'Recovered', 'first_doses', 'population', 'second_doses', 'vaccinations']
+derived_metrics = ['case_fatality_rate', 'cases_per_million', 'deaths_per_million', 'pct_fully_vaccinated']
+
+
+def get_date_wise_metrics_pandas(df, state_population_df, vaccine_df):
     date_wise_metrics = pd.pivot_table(
                     df,
                     index='Date',
@@ -40,3 +49,134 @@ def get_date_wise_metrics(df, state_population_df, vaccine_df):
     date_wise_metrics = date_wise_metrics.interpolate()
 
     return date_wise_metrics
+
+
+def nan_to_zero(values):
+    # pivot_table's sum skips missing values
+    return np.where(np.isnan(values), 0, values) if values.dtype.kind == 'f' else values
+
+
+def sum_rows(positions, values, n_rows):
+    summed = np.zeros((n_rows, values.shape[1]), dtype=values.dtype)
+    if len(np.unique(positions)) == len(positions):
+        summed[positions] = values
+    else:
+        np.add.at(summed, positions, values)
+    return summed
+
+
+def get_date_wise_raw_blocks(df, state_population_df, vaccine_df):
+    # (date x state) arrays holding the same sums as pivoting on Status, merging and pivoting on state
+    states = pd.Index(sorted(df.columns[2:]))
+    dates, date_positions = np.unique(df['Date'].to_numpy(), return_inverse=True)
+    dates = pd.DatetimeIndex(dates, name='Date')
+    values = nan_to_zero(df[states].to_numpy())
+    status = df['Status'].to_numpy()
+
+    blocks = {}
+    for metric in statuses:
+        mask = status == metric
+        blocks[metric] = sum_rows(date_positions[mask], values[mask], len(dates))
+
+    population = state_population_df.drop_duplicates('state').set_index('state')['population'].reindex(states)
+    blocks['population'] = np.repeat(population.fillna(0).to_numpy()[None, :], len(dates), axis=0)
+
+    rows = dates.get_indexer(vaccine_df['Date'])
+    cols = states.get_indexer(vaccine_df['state'])
+    matched = (rows >= 0) & (cols >= 0)
+    cells = rows[matched] * len(states) + cols[matched]
+    for metric in vaccine_metrics:
+        metric_values = nan_to_zero(vaccine_df[metric].to_numpy(dtype=float)[matched])
+        blocks[metric] = np.bincount(cells, weights=metric_values,
+                                     minlength=len(dates) * len(states)).reshape(len(dates), len(states))
+
+    return dates, states, blocks
+
+
+def shift(values, periods):
+    shifted = np.full(values.shape, np.nan)
+    if periods < len(values):
+        shifted[periods:] = values[:len(values) - periods]
+    return shifted
+
+
+def get_date_wise_derived_blocks(blocks):
+    population = blocks['population']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            'case_fatality_rate': blocks['Deceased'] / shift(blocks['Confirmed'], avg_days_to_death),
+            'cases_per_million': blocks['Confirmed'] / population * 1000000,
+            'deaths_per_million': blocks['Deceased'] / population * 1000000,
+            'pct_fully_vaccinated': blocks['second_doses'] / population,
+        }
+
+
+def interpolate_block(values):
+    # DataFrame.interpolate() down every column at once, linear in row position, leading gaps stay missing and
+    # trailing gaps carry the last value forward
+    missing = np.isnan(values)
+    if not missing.any():
+        return values
+    n_rows = len(values)
+    positions = np.arange(n_rows)[:, None]
+    previous = np.maximum.accumulate(np.where(missing, -1, positions), axis=0)
+    following = np.minimum.accumulate(np.where(missing, n_rows, positions)[::-1], axis=0)[::-1]
+    columns = np.arange(values.shape[1])
+    previous_values = values[np.maximum(previous, 0), columns]
+    following_values = values[np.minimum(following, n_rows - 1), columns]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Same operation order as np.interp, which pandas uses, so the results match bit for bit
+        slope = (following_values - previous_values) / (following - previous)
+        filled = slope * (positions - previous) + previous_values
+    filled = np.where(following == n_rows, previous_values, filled)
+    filled = np.where(previous < 0, np.nan, filled)
+    return np.where(missing, filled, values)
+
+
+def assemble_date_wise_metrics(dates, states, blocks):
+    n_states = len(states)
+    raw = [metric for metric in raw_metrics if metric in blocks]
+    derived = [metric for metric in derived_metrics if metric in blocks]
+    positions = {metric: i * n_states + np.arange(n_states) for i, metric in enumerate(raw)}
+    positions.update({metric: len(raw) * n_states + i + len(derived) * np.arange(n_states)
+                      for i, metric in enumerate(derived)})
+
+    columns = [None] * (len(raw) + len(derived)) * n_states
+    for metric, metric_positions in positions.items():
+        for position, state in zip(metric_positions, states):
+            columns[position] = (metric, state)
+
+    by_dtype = {}
+    for metric in raw + derived:
+        by_dtype.setdefault(blocks[metric].dtype, []).append(metric)
+    frame_blocks = [
+        (np.concatenate([positions[metric] for metric in metrics]).tolist(),
+         np.concatenate([blocks[metric].T for metric in metrics]))
+        for metrics in by_dtype.values()
+    ]
+    return frame_from_blocks(frame_blocks, dates, pd.MultiIndex.from_tuples(columns, names=[None, 'state']))
+
+
+def get_date_wise_raw_metrics(df, state_population_df, vaccine_df):
+    return assemble_date_wise_metrics(*get_date_wise_raw_blocks(df, state_population_df, vaccine_df))
+
+
+def add_date_wise_derived_metrics(date_wise_metrics):
+    states = date_wise_metrics['Confirmed'].columns
+    blocks = {metric: date_wise_metrics[metric][states].to_numpy() for metric in raw_metrics}
+    blocks.update(get_date_wise_derived_blocks(blocks))
+    return assemble_date_wise_metrics(date_wise_metrics.index, states, blocks)
+
+
+@timed
+def get_date_wise_metrics(df, state_population_df, vaccine_df):
+    if date_wise_engine == 'pandas':
+        return get_date_wise_metrics_pandas(df, state_population_df, vaccine_df)
+
+    dates, states, blocks = get_date_wise_raw_blocks(df, state_population_df, vaccine_df)
+    blocks.update(get_date_wise_derived_blocks(blocks))
+    for metric, values in blocks.items():
+        if values.dtype.kind == 'f':
+            blocks[metric] = interpolate_block(np.where(values == np.inf, np.nan, values))
+
+    return assemble_date_wise_metrics(dates, states, blocks)
@@ -0,0 +1,123 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from config import avg_days_to_death, district_data_path, district_population_path, district_geojson_path
+from columnar import load_or_convert
+from regions import get_region_metrics
+from geo import simplify_geojson
+from metrics import timed
+
+district_count_columns = ['Confirmed', 'Recovered', 'Deceased']
+
+# Same merges clean_raw_data makes for the state wise numbers, so every district has a state to roll up into
+district_state_conversion = {
+    'Ladakh': 'Jammu and Kashmir',
+    'Dadra and Nagar Haveli and Daman and Diu': 'Dadra and Nagar Haveli',
+}
+
+# Buckets covid19india keeps for cases it could not place in a district, none of them is on the map
+unassigned_districts = ['Unknown', 'Other State', 'Other Region', 'Foreign Evacuees', 'Airport Quarantine',
+                        'Railway Quarantine', 'Evacuees', 'BSF Camp', 'State Pool']
+
+
+def get_district_key(district, state):
+    # District names repeat across states
+    return district + ', ' + state
+
+
+@timed
+def read_districts_csv(path):
+    districts_df = pd.read_csv(path, usecols=['Date', 'State', 'District'] + district_count_columns,
+                               dtype={column: 'float64' for column in district_count_columns})
+    districts_df['State'] = districts_df['State'].astype('category')
+    districts_df['District'] = districts_df['District'].astype('category')
+    districts_df['Date'] = pd.to_datetime(districts_df['Date'], format='%Y-%m-%d')
+    return districts_df
+
+
+def get_last_rows(order, groups, n_groups):
+    # order lists rows by group, then date. The last row of every group, -1 for groups without any
+    last_rows = np.full(n_groups, -1)
+    if len(order):
+        sorted_groups = groups[order]
+        is_last = np.append(sorted_groups[1:] != sorted_groups[:-1], True)
+        last_rows[sorted_groups[is_last]] = order[is_last]
+    return last_rows
+
+
+def get_district_totals_df(districts_df, district_population_df=None):
+    # Grouped on the category codes, so only one string per district is ever built
+    states = districts_df['State'].cat
+    districts = districts_df['District'].cat
+    n_districts = len(districts.categories)
+    pairs = states.codes.to_numpy(dtype=np.int64) * n_districts + districts.codes.to_numpy()
+    pairs, groups = np.unique(pairs, return_inverse=True)
+    dates = districts_df['Date'].to_numpy()
+    order = np.lexsort((dates, groups))
+
+    # The counts are cumulative, so a district's total is its last reading. Confirmed stops avg_days_to_death before
+    # the last day like the state totals
+    latest_rows = get_last_rows(order, groups, len(pairs))
+    resolved = dates <= dates.max() - np.timedelta64(avg_days_to_death, 'D')
+    resolved_rows = get_last_rows(order[resolved[order]], groups, len(pairs))
+
+    state_names = states.categories[pairs // n_districts].astype(str)
+    district_names = districts.categories[pairs % n_districts].astype(str)
+    confirmed = districts_df['Confirmed'].to_numpy()
+    district_totals_df = pd.DataFrame({
+        'state': state_names.map(lambda state: district_state_conversion.get(state, state)),
+        'Confirmed': np.where(resolved_rows >= 0, confirmed[resolved_rows], 0),
+        'Deceased': districts_df['Deceased'].to_numpy()[latest_rows],
+        'Recovered': districts_df['Recovered'].to_numpy()[latest_rows],
+    }, index=pd.Index(get_district_key(district_names, state_names), name='district'))
+    district_totals_df = district_totals_df[~district_names.isin(unassigned_districts)]
+
+    if district_population_df is not None:
+        population = district_population_df.set_index(
+            get_district_key(district_population_df['district'], district_population_df['state']))['population']
+        district_totals_df['population'] = population.reindex(district_totals_df.index).to_numpy()
+    return district_totals_df
+
+
+@timed
+def get_district_region_metrics(districts_df, district_population_df=None, state_totals_df=None):
+    # The districts plus the states and India rolled up from them. state_totals_df (get_state_totals_df) hands the
+    # states what districts.csv doesn't have, the vaccine doses and the population when there is none per district.
+    # Districts of states it doesn't know are dropped, like the state level merges drop them
+    district_totals_df = get_district_totals_df(districts_df, district_population_df)
+    if state_totals_df is not None:
+        district_totals_df = district_totals_df[district_totals_df['state'].isin(state_totals_df.index)]
+    region_metrics = get_region_metrics(district_totals_df, ['district', 'state'], state_totals_df)
+    region_metrics['district']['id'] = region_metrics['district'].index
+    return region_metrics
+
+
+def get_district_metrics_df(districts_df, district_population_df=None):
+    return get_district_region_metrics(districts_df, district_population_df)['district']
+
+
+def load_district_region_metrics(state_totals_df=None):
+    if not os.path.exists(district_data_path):
+        return {}
+    districts_df = load_or_convert(district_data_path, 'districts', read_districts_csv)
+    district_population_df = None
+    if os.path.exists(district_population_path):
+        district_population_df = pd.read_csv(district_population_path)
+    return get_district_region_metrics(districts_df, district_population_df, state_totals_df)
+
+
+@timed
+def modify_district_geojson(district_geojson):
+    for feature in district_geojson['features']:
+        properties = feature['properties']
+        feature['id'] = get_district_key(properties['district'], properties['st_nm'])
+    return district_geojson
+
+
+def load_district_geojson():
+    if not os.path.exists(district_geojson_path):
+        return None
+    with open(district_geojson_path, 'r') as f:
+        district_geojson = json.load(f)
+    return simplify_geojson(modify_district_geojson(district_geojson))
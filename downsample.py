@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+from metrics import timed
+
+
+def lttb_rows(x, y, max_points):
+    # Largest triangle three buckets over every column of y at once. The first and last rows are always kept, every
+    # bucket in between keeps the row spanning the largest triangle with the row kept before it and the mean of the
+    # next bucket. Missing values never win a bucket unless the whole bucket is missing, so gaps stay gaps
+    n, columns = y.shape
+    if not max_points or n <= max(max_points, 2):
+        return np.tile(np.arange(n)[:, None], (1, columns))
+    max_points = max(max_points, 3)
+
+    # Bucket b spans edges[b]:edges[b + 1], the last edge is a bucket holding only the last row
+    edges = np.append((np.arange(max_points - 1) * (n - 2) / (max_points - 2)).astype(int) + 1, n)
+    edges[-2] = n - 1
+    present = ~np.isnan(y)
+    filled = np.where(present, y, 0.)
+    summed = np.vstack([np.zeros(columns), np.cumsum(filled, axis=0)])
+    counted = np.vstack([np.zeros(columns), np.cumsum(present, axis=0)])
+
+    rows = np.empty((max_points, columns), dtype=np.int64)
+    rows[0], rows[-1] = 0, n - 1
+    all_columns = np.arange(columns)
+    for bucket in range(max_points - 2):
+        start, end, next_end = edges[bucket], edges[bucket + 1], edges[bucket + 2]
+        next_x = x[end:next_end].mean()
+        next_y = (summed[next_end] - summed[end]) / np.maximum(counted[next_end] - counted[end], 1)
+        previous = rows[bucket]
+        previous_x, previous_y = x[previous], filled[previous, all_columns]
+        area = np.abs((previous_x - next_x) * (filled[start:end] - previous_y)
+                      - (previous_x - x[start:end, None]) * (next_y - previous_y))
+        area[~present[start:end]] = -1
+        rows[bucket + 1] = start + area.argmax(axis=0)
+    return rows
+
+
+def get_series_rows(dates, values, max_points):
+    # Day positions to plot for every series in values, (series, day)
+    x = dates.values.astype('datetime64[D]').astype(np.int64).astype(float)
+    return lttb_rows(x, values.T.astype(float), max_points).T
+
+
+@timed
+def get_plot_rows(series_store, window, max_points):
+    # Day positions to plot for every (metric, region) of one window, computed once per snapshot
+    values = series_store.values[series_store.windows[window]]
+    n_metrics, n_regions, n_days = values.shape
+    rows = get_series_rows(series_store.dates, values.reshape(-1, n_days), max_points)
+    return rows.reshape(n_metrics, n_regions, -1)
+
+
+def get_range_rows(index, start, end):
+    # Every row inside a zoomed range plus one on each side, so the line runs to the edges of the plot
+    first = max(index.searchsorted(pd.Timestamp(start), side='left') - 1, 0)
+    last = min(index.searchsorted(pd.Timestamp(end), side='right') + 1, len(index))
+    return np.arange(first, last)
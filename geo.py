@@ -0,0 +1,102 @@
+import gzip
+import hashlib
+import json
+import numpy as np
+from config import geojson_tolerance, geojson_precision
+from metrics import timed
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def simplify_line(points, tolerance):
+    # Douglas-Peucker, iterative so long borders don't hit the recursion limit
+    points = np.asarray(points, dtype=float)
+    if len(points) < 3:
+        return points
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        a, b = points[start], points[end]
+        segment = points[start + 1:end]
+        ab = b - a
+        length = np.hypot(*ab)
+        if length == 0:
+            distances = np.hypot(*(segment - a).T)
+        else:
+            distances = np.abs(ab[0] * (segment[:, 1] - a[1]) - ab[1] * (segment[:, 0] - a[0])) / length
+        farthest = int(distances.argmax())
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return points[keep]
+
+
+def simplify_ring(ring, tolerance, precision):
+    ring = np.round(simplify_line(ring, tolerance), precision)
+    # Quantizing can fold neighbouring vertices onto each other
+    distinct = np.ones(len(ring), dtype=bool)
+    distinct[1:] = (np.diff(ring, axis=0) != 0).any(axis=1)
+    ring = ring[distinct]
+    if len(ring) < 4:
+        return None
+    return ring.tolist()
+
+
+def simplify_polygon(polygon, tolerance, precision):
+    exterior = simplify_ring(polygon[0], tolerance, precision)
+    if exterior is None:
+        return None
+    holes = [simplify_ring(ring, tolerance, precision) for ring in polygon[1:]]
+    return [exterior] + [hole for hole in holes if hole is not None]
+
+
+def simplify_geometry(geometry, tolerance, precision):
+    if geometry['type'] == 'Polygon':
+        polygons = [geometry['coordinates']]
+    elif geometry['type'] == 'MultiPolygon':
+        polygons = geometry['coordinates']
+    else:
+        return geometry
+
+    simplified = [simplify_polygon(polygon, tolerance, precision) for polygon in polygons]
+    simplified = [polygon for polygon in simplified if polygon is not None]
+    if not simplified:
+        # Too small to survive the tolerance, keep the original outline rather than losing the region
+        simplified = [[np.round(polygon[0], precision).tolist()] for polygon in polygons]
+
+    if geometry['type'] == 'Polygon':
+        return {'type': 'Polygon', 'coordinates': simplified[0]}
+    return {'type': 'MultiPolygon', 'coordinates': simplified}
+
+
+@timed
+def simplify_geojson(geojson, tolerance=geojson_tolerance, precision=geojson_precision):
+    features = []
+    for feature in geojson['features']:
+        feature = dict(feature)
+        feature['geometry'] = simplify_geometry(feature['geometry'], tolerance, precision)
+        features.append(feature)
+    return {**geojson, 'features': features}
+
+
+@timed
+def encode_geojson(geojson):
+    body = json.dumps(geojson, separators=(',', ':')).encode()
+    encoded = {'identity': body, 'gzip': gzip.compress(body, compresslevel=9)}
+    if brotli is not None:
+        encoded['br'] = brotli.compress(body, quality=11)
+    return encoded
+
+
+def get_geojson_asset_name(encoded, prefix='states_india'):
+    return f"{prefix}.{hashlib.sha256(encoded['identity']).hexdigest()[:12]}.json"
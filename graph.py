@@ -1,5 +1,8 @@
+import numpy as np
 import plotly.graph_objects as go
 import dash_core_components as dcc
+from config import moving_avg_days
+from metrics import timed
 
 def generateDiscreteColourScale(colour_set):
     #colour set is a list of lists
@@ -31,128 +34,194 @@ color_schemes = [
     ['#bdc3c7'] * 10 + ['#d91e18'] * 22,
 ]
 
-def get_choropleth(state_metrics_df, india_geojson):
-    colorscale = generateDiscreteColourScale(color_schemes)
-
-    text = []
-    for state in state_metrics_df.index:
-        text.append(f'<b>{state}</b><br>(Click to view data)')
-    data = [
-        go.Choroplethmapbox(
-                        geojson=india_geojson,
-                        locations=state_metrics_df['id'],
-                        z=state_metrics_df['deaths_per_million'],
-                        # colorscale="YlOrRd",
-                        colorscale=colorscale,
-                        showscale=False,
-                        marker_opacity=0.8,
-                        text=text,
-                        hovertemplate='%{text}<extra></extra>',
-                        )
-    ]
-
-    layout = go.Layout(
-        mapbox_style="carto-positron",
-        mapbox_zoom=3.5,
-        mapbox_center={"lat": 23.0895, "lon": 81.5},
-        # height=565,
-        margin={"r": 0, "t": 0, "l": 0, "b": 0},
-        hoverlabel=dict(
-            bgcolor="white",
-            font_size=28,
-            font_family="Calibri"
-        )
-    )
-
-    dash_graph = dcc.Graph(figure={
-                            'data': data,
-                            'layout': layout
-                            },
-                            id='choropleth',
-                            style={
-                                'margin': 'auto',
-                                'width': '57.5vh',
-                                'height': '75vh',
-                            }
+# Figures are plain dicts of lists and numpy arrays: plotly's graph objects validate every property on every call and
+# only go through its generic JSON encoder. The static parts are built once here and shared by every figure
+choropleth_colorscale = [list(stop) for stop in generateDiscreteColourScale(color_schemes)]
+
+choropleth_layout = {
+    'mapbox': {'style': 'carto-positron', 'zoom': 3.5, 'center': {'lat': 23.0895, 'lon': 81.5}},
+    # 'height': 565,
+    'margin': {'r': 0, 't': 0, 'l': 0, 'b': 0},
+    'hoverlabel': {'bgcolor': 'white', 'font': {'size': 28, 'family': 'Calibri'}},
+}
+
+choropleth_style = {
+    'margin': 'auto',
+    'width': '57.5vh',
+    'height': '75vh',
+}
+
+date_wise_layout = {
+    'yaxis': {'rangemode': 'tozero'},
+    # 'height': 126,
+    # 'width': 430,
+    'margin': {'l': 40, 'r': 0, 't': 10, 'b': 30},
+}
+
+date_wise_percent_layout = {**date_wise_layout, 'yaxis': {'tickformat': '%', 'rangemode': 'tozero'}}
+
+# Plotted as percentages, the axis and the hover text of every other metric show plain numbers
+percent_metrics = ['case_fatality_rate', 'pct_fully_vaccinated', 'window_case_fatality_rate', 'second_dose_share']
+
+# Plotly's default colours, an overlay of more states than this cycles through them again
+comparison_colors = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f',
+                     '#bcbd22', '#17becf']
+
+comparison_style = {
+    'margin-left': '3vh',
+    'margin-right': '3vh',
+}
+
+# Pixels per row of small multiples
+small_multiple_height = 160
+
+date_wise_style = {
+    'margin-left': '3vh',
+    'margin-right': '3vh',
+    'margin-bottom': '0vh',
+    'margin-top': '0px',
+    'width': '55vh',
+    'height': '16.75vh',
+}
+
+
+@timed
+def get_choropleth_figure(metrics_df, geojson, level='state'):
+    text = [f'<b>{region}</b><br>(Click to view data)' for region in metrics_df.index]
+    trace = {
+        'type': 'choroplethmapbox',
+        # Either the geojson itself or the url plotly.js should fetch it from
+        'geojson': geojson,
+        'locations': metrics_df['id'].values,
+        'z': np.ascontiguousarray(metrics_df['deaths_per_million'].values),
+        # 'colorscale': 'YlOrRd',
+        'colorscale': choropleth_colorscale,
+        'showscale': False,
+        'marker': {'opacity': 0.8},
+        'text': text,
+        'hovertemplate': '%{text}<extra></extra>',
+    }
+    if level != 'state':
+        # Clicking any region selects the state it belongs to
+        trace['customdata'] = metrics_df['state'].values
+    return {'data': [trace], 'layout': choropleth_layout}
+
+
+def get_choropleth(state_metrics_df, geojson):
+    dash_graph = dcc.Graph(figure=get_choropleth_figure(state_metrics_df, geojson),
+                           id='choropleth',
+                           style=choropleth_style
                 )
     return dash_graph
 
 
-def get_date_wise_plot(date_wise_metrics, state, metric):
-    trace = go.Scatter(
-        x=date_wise_metrics.index,
-        y=date_wise_metrics[(metric, state)],
-        name=state,
-        marker_color='blue',
-        hovertemplate='%{y:,%}<extra></extra>' if metric == 'case_fatality_rate' else '%{y:.0f}<extra></extra>'
-    )
-
-    data = [trace]
-
-    layout = go.Layout(
-        yaxis=dict(rangemode='tozero'),
-        # height=126,
-        # width=430,
-        margin=dict(l=40, r=0, t=10, b=30)
-    )
-
-    if metric in ['case_fatality_rate', 'pct_fully_vaccinated']:
-        layout['yaxis'] = dict(tickformat='%', rangemode='tozero')
+def get_series_plot(dates, values, metric, name=None, rows=None, xaxis_range=None):
+    # rows picks the positions to plot (downsampled or a zoomed range), all of them by default
+    if rows is not None:
+        dates, values = dates[rows], values[rows]
+    trace = {
+        'type': 'scatter',
+        'x': dates,
+        'y': values,
+        'marker': {'color': 'blue'},
+        'hovertemplate': '%{y:,%}<extra></extra>' if metric == 'case_fatality_rate' else '%{y:.0f}<extra></extra>',
+    }
+    if name is not None:
+        trace['name'] = name
+
+    layout = date_wise_percent_layout if metric in percent_metrics else date_wise_layout
+    if xaxis_range is not None:
+        layout = {**layout, 'xaxis': {'range': xaxis_range}}
 
     dash_graph = dcc.Graph(figure={
-        'data': data,
+        'data': [trace],
         'layout': layout
         },
-        style={
-            'margin-left': '3vh',
-            'margin-right': '3vh',
-            'margin-bottom': '0vh',
-            'margin-top': '0px',
-            'width': '55vh',
-            'height': '16.75vh',
-        },
+        id=f'{metric}_plot',
+        style=date_wise_style,
     )
 
     return dash_graph
 
 
-def get_india_date_wise_plot(india_df, metric):
-    moving_avg_df = india_df.copy()
-    moving_avg_df = moving_avg_df.rolling(7).mean()
-    date_mask = moving_avg_df.index > '2020-07-01'
-    trace = go.Scatter(
-        x=moving_avg_df[date_mask].index,
-        y=moving_avg_df[date_mask][metric],
-        marker_color='blue',
-        hovertemplate='%{y:,%}<extra></extra>' if metric == 'case_fatality_rate' else '%{y:.0f}<extra></extra>'
-    )
-    data = [trace]
-
-    layout = go.Layout(
-        yaxis=dict(rangemode='tozero'),
-        # height=126,
-        # width=430,
-        margin=dict(l=40, r=0, t=10, b=30)
-    )
-
-    if metric in ['case_fatality_rate', 'pct_fully_vaccinated']:
-        layout['yaxis'] = dict(tickformat='%', rangemode='tozero')
-
-    dash_graph = dcc.Graph(figure={
-        'data': data,
-        'layout': layout
-    },
-        style={
-            'margin-left': '3vh',
-            'margin-right': '3vh',
-            'margin-bottom': '0vh',
-            'margin-top': '0px',
-            'width': '55vh',
-            'height': '16.75vh',
-        },
-    )
-
-    return dash_graph
+@timed
+def get_date_wise_plot(series_store, state, metric, rows=None, xaxis_range=None, window=moving_avg_days):
+    return get_series_plot(series_store.dates.values, series_store.series(metric, state, window), metric, state, rows,
+                           xaxis_range)
+
+
+@timed
+def get_india_date_wise_plot(series_store, metric, rows=None, xaxis_range=None, window=moving_avg_days):
+    return get_series_plot(series_store.dates.values, series_store.series(metric, 'India', window), metric, None, rows,
+                           xaxis_range)
+
+
+def get_small_multiple_axes(n_plots):
+    # A square-ish grid filled row by row from the top, every axis matches the first so the plots compare at a glance
+    columns = int(np.ceil(np.sqrt(n_plots)))
+    rows = int(np.ceil(n_plots / columns))
+    positions = np.arange(n_plots)
+    left = positions % columns / columns
+    top = 1 - positions // columns / rows
+    gap_x, gap_y = 0.02, 0.3 / rows
+    axes = {}
+    for position in range(n_plots):
+        suffix = '' if position == 0 else str(position + 1)
+        axes[f'xaxis{suffix}'] = {'domain': [left[position] + gap_x, left[position] + 1 / columns - gap_x],
+                                  'anchor': f'y{suffix}', 'showticklabels': bool(position >= n_plots - columns)}
+        axes[f'yaxis{suffix}'] = {'domain': [top[position] - 1 / rows + gap_y / 2, top[position] - gap_y / 2],
+                                  'anchor': f'x{suffix}', 'rangemode': 'tozero'}
+        if position:
+            axes[f'xaxis{suffix}']['matches'] = 'x'
+            axes[f'yaxis{suffix}']['matches'] = 'y'
+    titles = [{'x': left[position] + 0.5 / columns, 'y': top[position] - gap_y / 2, 'xref': 'paper', 'yref': 'paper',
+               'xanchor': 'center', 'yanchor': 'bottom', 'showarrow': False, 'font': {'size': 11}}
+              for position in range(n_plots)]
+    return axes, titles, rows
+
+
+@timed
+def get_comparison_figure(series_store, metric, states, window=moving_avg_days, rows=None, small_multiples=False):
+    # Every requested state's series comes out of the store in one fancy index, (state, day), and so do the days
+    # each of them plots (rows, one row of day positions per state, every day by default). One figure with shared axes:
+    # the states overlaid, or a grid of small multiples
+    codes = [series_store.regions[state] for state in states]
+    values = series_store.metric_values(metric, window)[codes]
+    if rows is None:
+        rows = np.broadcast_to(np.arange(values.shape[1]), values.shape)
+    values = np.take_along_axis(values, rows, axis=1)
+    dates = series_store.dates.values[rows]
+
+    percent = metric in percent_metrics or window == 'week_over_week'
+    hover_format = ',%' if percent else '.1f' if window == 'doubling_days' else '.0f'
+    traces = [{
+        'type': 'scatter',
+        'x': dates[position],
+        'y': values[position],
+        'name': state,
+        'marker': {'color': comparison_colors[position % len(comparison_colors)]},
+        'hovertemplate': f'%{{y:{hover_format}}}<extra>{state}</extra>',
+    } for position, state in enumerate(states)]
+
+    tickformat = {'tickformat': '%'} if percent else {}
+    if not small_multiples or not states:
+        layout = {**date_wise_layout, 'yaxis': {'rangemode': 'tozero', **tickformat}, 'height': 400,
+                  'showlegend': True}
+        return {'data': traces, 'layout': layout}
+
+    axes, titles, n_rows = get_small_multiple_axes(len(states))
+    for position, (trace, title, state) in enumerate(zip(traces, titles, states)):
+        suffix = '' if position == 0 else str(position + 1)
+        trace['xaxis'], trace['yaxis'] = f'x{suffix}', f'y{suffix}'
+        title['text'] = state
+        axes[f'yaxis{suffix}'].update(tickformat)
+    layout = {**axes, 'annotations': titles, 'showlegend': False, 'height': n_rows * small_multiple_height,
+              'margin': {'l': 40, 'r': 0, 't': 20, 'b': 30}}
+    return {'data': traces, 'layout': layout}
+
+
+def get_comparison_plot(figure):
+    return dcc.Graph(figure=figure, id='comparison_plot', style=comparison_style)
 
 
 metric = 'case_fatality_rate'
@@ -0,0 +1,23 @@
+# Passed to gunicorn by the Procfile
+import subprocess
+import sys
+
+
+def when_ready(server):
+    # With --preload the workers only map artifacts, a single builder process next to them builds new ones
+    from config import preload_shared, refresh_interval
+    if preload_shared and refresh_interval:
+        server.artifact_builder = subprocess.Popen([sys.executable, '-m', 'builder'])
+
+
+def post_fork(server, worker):
+    # With --preload the app is imported in the master, only the workers it forks refresh the data
+    from snapshot import start_worker_refreshers
+    start_worker_refreshers()
+
+
+def on_exit(server):
+    builder = getattr(server, 'artifact_builder', None)
+    if builder is not None:
+        builder.terminate()
+        builder.wait()
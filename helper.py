@@ -1,5 +1,7 @@
 import pandas as pd
 from config import avg_days_to_death
+from columnar import load_or_convert
+from metrics import timed
 
 
 state_abbreviations_dict = {
@@ -93,9 +95,45 @@ state_id_map = {
 }
 
 
+# Columns of state_wise_daily.csv that clean_raw_data throws away: the text date, the India and unassigned totals and
+# Daman and Diu
+unused_daily_columns = ['Date', 'UN', 'TT', 'DD']
+
+
+def parse_daily_dates(values):
+    return pd.to_datetime(values, format='%Y-%m-%d')
+
+
+def to_daily_counts(df):
+    # Blank cells count as 0, and the counts are int32 whether the rows came through read_daily_csv or are a batch
+    # handed to ingest.py
+    for column in df.columns:
+        if column not in ['Date', 'Date_YMD', 'Status'] and df[column].dtype != 'int32':
+            df[column] = pd.to_numeric(df[column]).fillna(0).astype('int32')
+    return df
+
+
+@timed
+def read_daily_csv(path):
+    # Only the columns clean_raw_data keeps, counts as int32 and the status as a category
+    columns = [column for column in pd.read_csv(path, nrows=0).columns if column not in unused_daily_columns]
+    daily_df = to_daily_counts(pd.read_csv(path, usecols=columns)[columns])
+    # Both convert faster once the whole column is read than through read_csv's dtype / date_parser hooks
+    daily_df['Status'] = daily_df['Status'].astype('category')
+    daily_df['Date_YMD'] = parse_daily_dates(daily_df['Date_YMD'])
+    return daily_df
+
+
+def load_daily_df(path='state_wise_daily.csv'):
+    return load_or_convert(path, 'daily', read_daily_csv)
+
+
+@timed
 def clean_raw_data(df):
+    df = to_daily_counts(df)
     df['JK'] = df['JK'] + df['LA']
-    df.drop(['Date', 'LA', 'UN', 'TT', 'DD'], axis=1, inplace=True)
+    # read_daily_csv already leaves out everything but LA
+    df.drop(['Date', 'LA', 'UN', 'TT', 'DD'], axis=1, inplace=True, errors='ignore')
     df.rename({'Date_YMD': 'Date'}, axis=1, inplace=True)
     df['Date'] = pd.to_datetime(df['Date'], format='%Y-%m-%d')
     df.columns = [state_abbreviations_dict.get(col, col) for col in df.columns]
@@ -105,6 +143,7 @@ def clean_raw_data(df):
     return df
 
 
+@timed
 def get_modified_state_metrics_df(state_metrics_df):
     state_metrics_df['id'] = state_metrics_df.index.map(state_id_map)
     return state_metrics_df
@@ -129,6 +168,7 @@ def get_confirmed_cum_sum_df(confirmed_df):
     return confirmed_cum_sum_df
 
 
+@timed
 def add_derived_metrics(df):
     df['cases_per_million'] = df['Confirmed'] / df['population'] * 1000000
     df['deaths_per_million'] = df['Deceased'] / df['population'] * 1000000
@@ -138,6 +178,7 @@ def add_derived_metrics(df):
     return df
 
 
+@timed
 def modify_geojson(india_geojson):
     for feature in india_geojson["features"]:
         feature["id"] = feature["properties"]["state_code"]
@@ -200,3 +241,7 @@ def fix_name(metric):
     return metric.title()
 
 
+def print_date(date):
+    day = date.day
+    suffix = 'th' if 11 <= day <= 13 else {1: 'st', 2: 'nd', 3: 'rd'}.get(day % 10, 'th')
+    return f"{day}{suffix} {date:%B %Y}"
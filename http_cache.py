@@ -0,0 +1,21 @@
+import hashlib
+
+# Content-Encodings whose bodies carry their own ETag, see get_encoded_etag
+encodings = ['br', 'gzip', 'deflate', 'zstd']
+
+
+def get_etag(version, path, body=b''):
+    # Layouts and API responses are a function of the data snapshot and the request alone
+    return hashlib.sha256(b'\0'.join([version.encode(), path.encode(), body])).hexdigest()[:32]
+
+
+def get_encoded_etag(etag, encoding):
+    # Strong validators have to differ whenever the bytes do, so every compressed body gets its own. Tagged the way
+    # Flask-Compress (dash's compress=True) tags the bodies it compresses
+    return etag if encoding in (None, 'identity') else f'{etag}:{encoding}'
+
+
+def get_matching_etag(if_none_match, etag):
+    # The tag of whichever encoding of the body the client already holds, None if it holds none
+    return next((tag for tag in [etag] + [get_encoded_etag(etag, encoding) for encoding in encodings]
+                 if if_none_match.contains(tag)), None)
@@ -1,8 +1,9 @@
 import pandas as pd
 from helper import add_derived_metrics
+from metrics import timed
 
 
-def get_india_df(df, vaccine_df):
+def get_india_raw_df(df, vaccine_df):
     india_df = pd.concat([df.iloc[:, :2], df.iloc[:, 2:].sum(axis=1)], axis=1)
     india_df.columns = ['Date', 'Status', 'Value']
     india_df = pd.pivot_table(
@@ -17,6 +18,13 @@ def get_india_df(df, vaccine_df):
     india_mask = vaccine_df['state'] == 'India'
     india_df = pd.merge(india_df, vaccine_df[india_mask], how='left', on='Date')
     india_df.set_index('Date', inplace=True)
+
+    return india_df
+
+
+@timed
+def get_india_df(df, vaccine_df):
+    india_df = get_india_raw_df(df, vaccine_df)
     india_df = add_derived_metrics(india_df)
 
     return india_df
@@ -0,0 +1,233 @@
+import os
+import sys
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+from config import avg_days_to_death, region_metrics_source
+from helper import clean_raw_data, get_modified_state_metrics_df, add_derived_metrics
+from vaccine import prepare_cowin_df, get_daily_vaccinations_df, get_vaccine_cumulative_df
+from date_wise import get_date_wise_raw_metrics, add_date_wise_derived_metrics
+from india_overall import get_india_raw_df
+from state_level import add_state_metrics
+from artifacts import load_or_build_artifacts, save_artifacts, get_input_hash
+from metrics import timed
+
+# Everything here only touches the new rows plus the few trailing days the case fatality shift and the interpolation
+# of trailing gaps need as context
+
+raw_metrics = ['Confirmed', 'Deceased', 'Recovered', 'first_doses', 'population', 'second_doses', 'vaccinations']
+vaccine_metrics = ['vaccinations', 'first_doses', 'second_doses']
+india_raw_columns = ['Confirmed', 'Deceased', 'Recovered', 'population', 'state', 'vaccinations', 'first_doses',
+                     'second_doses']
+state_total_columns = ['Confirmed', 'Deceased', 'Recovered', 'population', 'second_doses', 'vaccinations']
+
+
+def get_new_daily_vaccinations(vaccine_cumulative_df, new_raw_vaccine_df):
+    combined_df = pd.concat([vaccine_cumulative_df, prepare_cowin_df(new_raw_vaccine_df)], ignore_index=True)
+    new_vaccine_df = get_daily_vaccinations_df(combined_df)
+    new_vaccine_df = new_vaccine_df[new_vaccine_df.index >= len(vaccine_cumulative_df)]
+    # An empty batch comes back as object columns, which would poison the pending rows it gets concatenated with
+    new_vaccine_df = new_vaccine_df.astype({metric: float for metric in vaccine_metrics})
+    return new_vaccine_df.reset_index(drop=True), get_vaccine_cumulative_df(combined_df)
+
+
+def get_vaccine_patch(vaccine_df, dates, columns):
+    # Wide (Date x (metric, state)) vaccine numbers for days that are already stored
+    patch_mask = vaccine_df['Date'].isin(dates)
+    if not patch_mask.any():
+        return None
+    patch = pd.pivot_table(vaccine_df[patch_mask], index='Date', columns='state', values=vaccine_metrics,
+                           aggfunc='sum')
+    patch = patch.reindex(columns=[col for col in columns if col[0] in vaccine_metrics], fill_value=0)
+    return patch.fillna(0)
+
+
+def get_last_finite_positions(derived_df, valid_from, valid_to):
+    # Per column, the last row in [valid_from, valid_to) holding a real (not interpolated) value, -1 if none
+    finite = derived_df.iloc[valid_from:valid_to].notna().to_numpy()
+    if finite.shape[0] == 0:
+        return np.full(derived_df.shape[1], -1)
+    from_end = finite[::-1].argmax(axis=0)
+    positions = valid_from + finite.shape[0] - 1 - from_end
+    return np.where(finite.any(axis=0), positions, -1)
+
+
+def update_date_wise_metrics(date_wise_metrics, new_df, vaccine_df):
+    columns = date_wise_metrics.columns
+    raw_columns = [col for col in columns if col[0] in raw_metrics]
+    dates = date_wise_metrics.index
+    n_old = len(date_wise_metrics)
+
+    if new_df.empty:
+        new_raw_df = date_wise_metrics[raw_columns].iloc[:0]
+    else:
+        population = date_wise_metrics['population'].iloc[-1]
+        state_population_df = pd.DataFrame({'state': population.index, 'population': population.values})
+        new_raw_df = get_date_wise_raw_metrics(new_df, state_population_df, vaccine_df[vaccine_df['Date'] > dates[-1]])
+        new_raw_df = new_raw_df.reindex(columns=raw_columns, fill_value=0)
+
+    patch = get_vaccine_patch(vaccine_df, dates, raw_columns)
+    first_changed = n_old if patch is None else dates.get_loc(patch.index.min())
+
+    # Grow the look-back until every column has a real value to anchor the interpolation of its trailing gap
+    lookback = 2 * avg_days_to_death
+    while True:
+        start = max(first_changed - lookback, 0)
+        window_df = pd.concat([date_wise_metrics[raw_columns].iloc[start:], new_raw_df])
+        if patch is not None:
+            window_df.loc[patch.index, patch.columns] += patch.to_numpy()
+        derived_df = add_date_wise_derived_metrics(window_df)[columns]
+        derived_df = derived_df.replace(np.inf, np.nan)
+
+        valid_from = 0 if start == 0 else avg_days_to_death
+        anchors = get_last_finite_positions(derived_df, valid_from, first_changed - start)
+        if start == 0 or (anchors >= 0).all():
+            break
+        lookback *= 2
+
+    rewrite_from = min(first_changed - start, max(anchors.min(), 0))
+    tail_df = derived_df.iloc[rewrite_from:]
+
+    # Rows up to each column's anchor are final already, everything after it is re-interpolated
+    n_kept = first_changed - start - rewrite_from
+    if n_kept > 0:
+        kept_rows = np.arange(rewrite_from, first_changed - start)[:, None] <= anchors[None, :]
+        stored_df = date_wise_metrics.iloc[start + rewrite_from:first_changed]
+        head_df = tail_df.iloc[:n_kept].mask(pd.DataFrame(kept_rows, index=stored_df.index, columns=columns),
+                                             stored_df)
+        tail_df = pd.concat([head_df, tail_df.iloc[n_kept:]])
+    tail_df = tail_df.interpolate()
+
+    return pd.concat([date_wise_metrics.iloc[:start + rewrite_from], tail_df])
+
+
+def update_india_df(india_df, new_df, vaccine_df):
+    dates = india_df.index
+    n_old = len(india_df)
+
+    if new_df.empty:
+        new_raw_df = india_df[india_raw_columns].iloc[:0]
+    else:
+        new_raw_df = get_india_raw_df(new_df, vaccine_df[vaccine_df['Date'] > dates[-1]])
+
+    india_mask = (vaccine_df['state'] == 'India') & vaccine_df['Date'].isin(dates)
+    patch_df = vaccine_df[india_mask].set_index('Date')
+    first_changed = n_old if patch_df.empty else dates.get_loc(patch_df.index.min())
+
+    start = max(first_changed - avg_days_to_death, 0)
+    window_df = pd.concat([india_df[india_raw_columns].iloc[start:], new_raw_df])
+    if not patch_df.empty:
+        window_df.loc[patch_df.index, patch_df.columns] = patch_df
+    window_df = add_derived_metrics(window_df)
+
+    return pd.concat([india_df.iloc[:first_changed], window_df.iloc[first_changed - start:]])
+
+
+def get_new_state_totals(date_wise_metrics, states, old_max_date):
+    # Totals up to old_max_date of states the stored frame doesn't have yet. A full build only keeps states with CoWIN
+    # rows, so a build from before the vaccine data starts has none and they join when their first doses arrive
+    confirmed_df = date_wise_metrics['Confirmed'].loc[:old_max_date - timedelta(days=avg_days_to_death)]
+    old_rows_df = date_wise_metrics.loc[:old_max_date]
+    totals_df = pd.DataFrame({
+        'Confirmed': confirmed_df.sum().reindex(states),
+        'Deceased': old_rows_df['Deceased'].sum().reindex(states),
+        'Recovered': old_rows_df['Recovered'].sum().reindex(states),
+        'population': old_rows_df['population'].iloc[-1].reindex(states),
+        'second_doses': 0.,
+        'vaccinations': 0.,
+    }, index=pd.Index(states, name='state'))
+    return totals_df[state_total_columns]
+
+
+def update_state_metrics_df(state_metrics_df, date_wise_metrics, old_max_date, new_vaccine_df):
+    # A build from before the vaccine data starts has no vaccine totals yet
+    state_totals_df = state_metrics_df.drop('India').reindex(columns=state_total_columns, fill_value=0)
+    vaccinated_states = [state for state in new_vaccine_df['state'].unique()
+                         if state not in state_totals_df.index and state in date_wise_metrics['Confirmed'].columns]
+    if vaccinated_states:
+        state_totals_df = pd.concat([state_totals_df,
+                                     get_new_state_totals(date_wise_metrics, vaccinated_states, old_max_date)])
+        state_totals_df = state_totals_df.sort_index()
+    states = state_totals_df.index
+    new_max_date = date_wise_metrics.index[-1]
+    new_rows_df = date_wise_metrics[date_wise_metrics.index > old_max_date]
+
+    # Confirmed only counts cases old enough to have had avg_days_to_death to resolve, so its window slides
+    confirmed_df = date_wise_metrics['Confirmed'].loc[
+        old_max_date - timedelta(days=avg_days_to_death - 1):new_max_date - timedelta(days=avg_days_to_death)
+    ]
+    state_totals_df['Confirmed'] += confirmed_df.sum().reindex(states, fill_value=0)
+    for metric in ['Deceased', 'Recovered']:
+        state_totals_df[metric] += new_rows_df[metric].sum().reindex(states, fill_value=0)
+
+    if not new_vaccine_df.empty:
+        vaccine_totals_df = new_vaccine_df.groupby('state')[['second_doses', 'vaccinations']].sum()
+        for metric in ['second_doses', 'vaccinations']:
+            state_totals_df[metric] += vaccine_totals_df[metric].reindex(states, fill_value=0)
+
+    state_metrics_df = add_state_metrics(state_totals_df)
+    state_metrics_df = get_modified_state_metrics_df(state_metrics_df)
+    return state_metrics_df
+
+
+@timed
+def ingest(frames, new_daily_df, new_raw_vaccine_df):
+    date_wise_metrics = frames['date_wise_metrics']
+    old_max_date = date_wise_metrics.index[-1]
+
+    new_df = clean_raw_data(new_daily_df.copy())
+    if region_metrics_source == 'district' and not frames['district_metrics_df'].empty:
+        raise ValueError('State totals rolled up from districts.csv need a full rebuild')
+    if (new_df['Date'] <= old_max_date).any():
+        raise ValueError(f"Daily rows must be newer than {old_max_date:%Y-%m-%d}, revisions need a full rebuild")
+    new_max_date = old_max_date if new_df.empty else new_df['Date'].max()
+
+    new_vaccine_df, vaccine_cumulative_df = get_new_daily_vaccinations(frames['vaccine_cumulative_df'],
+                                                                       new_raw_vaccine_df)
+    vaccine_df = pd.concat([frames['pending_vaccine_df'], new_vaccine_df], ignore_index=True)
+    pending_mask = vaccine_df['Date'] > new_max_date
+
+    date_wise_metrics = update_date_wise_metrics(date_wise_metrics, new_df, vaccine_df[~pending_mask])
+
+    updated_frames = dict(frames)
+    updated_frames['date_wise_metrics'] = date_wise_metrics
+    updated_frames['india_df'] = update_india_df(frames['india_df'], new_df, vaccine_df[~pending_mask])
+    updated_frames['state_metrics_df'] = update_state_metrics_df(frames['state_metrics_df'], date_wise_metrics,
+                                                                 old_max_date, new_vaccine_df)
+    updated_frames['vaccine_cumulative_df'] = vaccine_cumulative_df
+    updated_frames['pending_vaccine_df'] = vaccine_df[pending_mask].reset_index(drop=True)
+    return updated_frames
+
+
+def append_rows(path, new_path):
+    # Appends the raw lines so a full rebuild from the csv reproduces exactly what was ingested
+    with open(new_path, 'r') as f:
+        header = f.readline()
+        rows = f.read().rstrip('\n')
+    with open(path, 'r') as f:
+        if f.readline().strip() != header.strip():
+            raise ValueError(f'{new_path} does not have the same columns as {path}')
+    if not rows:
+        return
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        ends_with_newline = f.read(1) == b'\n'
+    with open(path, 'a') as f:
+        f.write(rows + '\n' if ends_with_newline else '\n' + rows)
+
+
+def ingest_files(daily_path, vaccine_path):
+    _, frames = load_or_build_artifacts()
+    frames = ingest(frames, pd.read_csv(daily_path), pd.read_csv(vaccine_path))
+
+    append_rows('state_wise_daily.csv', daily_path)
+    append_rows('cowin_vaccine_data_statewise.csv', vaccine_path)
+
+    version = get_input_hash()
+    save_artifacts(frames, version)
+    return version, frames
+
+
+if __name__ == '__main__':
+    version, _ = ingest_files(sys.argv[1], sys.argv[2])
+    print(f'Ingested into artifacts version {version}')
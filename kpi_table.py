@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+from regions import root_region
+from metrics import timed
+
+kpi_metrics = ['pct_fully_vaccinated', 'cases_per_million', 'case_fatality_rate', 'deaths_per_million']
+
+# Shown as percentages, everything else goes through human_format's K / M suffixes
+percent_metrics = ['pct_fully_vaccinated', 'case_fatality_rate']
+
+# Higher is better for these, worse for every other metric
+higher_is_better_metrics = ['pct_fully_vaccinated']
+
+better_color = '#27ae60'
+worse_color = '#d91e18'
+
+
+def format_rounded(values):
+    # str(round(value, 2)) of a numpy float for every value
+    return np.round(values, 2).astype(str)
+
+
+def format_values(values, metric):
+    # Same strings helper.print_formatted builds one at a time
+    if metric in percent_metrics:
+        return np.char.add(np.char.mod('%.2f', 100 * values), '%')
+    scaled = np.abs(values)
+    magnitudes = np.zeros(len(values), dtype=int)
+    # Divided step by step like human_format, so the rounding sees the same floats
+    for _ in range(2):
+        larger = scaled >= 1000
+        scaled = np.where(larger, scaled / 1000.0, scaled)
+        magnitudes += larger
+    larger = scaled >= 1000
+    texts = np.where(magnitudes == 1, np.char.add(format_rounded(scaled), 'K'),
+                     np.where(magnitudes == 2, np.char.add(format_rounded(scaled), 'M'), format_rounded(np.abs(values))))
+    # Anything past millions is printed in full
+    return np.where((magnitudes == 2) & larger, format_rounded(np.abs(values)), texts)
+
+
+def format_deltas(values, reference):
+    # helper.print_delta against the national value for every region at once
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = values / reference - 1
+        percents = np.char.mod('%d', np.abs(np.rint(np.nan_to_num(change * 100, posinf=0, neginf=0))))
+    percents = np.where(np.abs(change) < 10, percents, '>1000')
+    percents = np.where(reference == 0, np.where(values == 0, '0', '∞'), percents)
+    return np.char.add(np.char.add(np.where(values > reference, '▲', '▼'), percents), '%')
+
+
+@timed
+def get_kpi_table(metrics_df, metrics=kpi_metrics):
+    # One row per region, (field, metric) columns: the value and its rank, the national value it is compared against
+    # and every string a KPI card shows. Built once per snapshot, the cards only look rows up
+    regions = metrics_df.index
+    is_root = regions == root_region
+    n_ranked = len(regions) - is_root.sum()
+    columns = {}
+    for metric in metrics:
+        values = metrics_df[metric].to_numpy(dtype=float)
+        ranks = metrics_df[f'{metric}_rank'].to_numpy(dtype=float)
+        reference = np.full(len(values), metrics_df.loc[root_region, metric])
+        if metric in higher_is_better_metrics:
+            colors = np.where(values > reference, better_color, worse_color)
+        else:
+            colors = np.where(values > reference, worse_color, better_color)
+        rank_texts = np.char.add(np.char.add('Rank : ', np.char.mod('%d', np.nan_to_num(ranks))), f' of {n_ranked}')
+
+        columns['value', metric] = values
+        columns['rank', metric] = ranks
+        columns['national_value', metric] = reference
+        columns['value_text', metric] = format_values(values, metric)
+        columns['delta_text', metric] = np.where(is_root, '-', np.char.add(format_deltas(values, reference),
+                                                                           ' vs National Avg'))
+        columns['color', metric] = np.where(is_root, 'white', colors)
+        columns['rank_text', metric] = np.where(is_root | np.isnan(ranks), '-', rank_texts)
+    return pd.DataFrame(columns, index=regions)
+
+
+@timed
+def get_kpi_texts(kpi_table, metrics=kpi_metrics):
+    # {region: {metric: (value, comparison with India, its colour, rank)}}, also shipped to the browser in clientside
+    # mode
+    fields = ['value_text', 'delta_text', 'color', 'rank_text']
+    kpi_texts = {region: {} for region in kpi_table.index}
+    for metric in metrics:
+        for region, *texts in zip(kpi_table.index, *(kpi_table[field, metric].tolist() for field in fields)):
+            kpi_texts[region][metric] = tuple(texts)
+    return kpi_texts
@@ -1,39 +1,64 @@
-import pandas as pd
-from helper import clean_raw_data, modify_geojson, get_modified_state_metrics_df
-from vaccine import vaccine_df
-from state_level import get_state_metrics_df
-from india_overall import get_india_df
-from date_wise import get_date_wise_metrics
-import json
-from create_app import create_app
-from config import in_production
+import logging
+from boot import Boot, BootServer
+from config import lazy_boot, log_level, preload_shared, refresh_interval
 
 # TODO Dadra and Nagar Haveli and Daman and Diu
 # TODO Add Navbar
 
 
-df = pd.read_csv('state_wise_daily.csv')
-df = clean_raw_data(df)
+def configure_logging():
+    # Nothing configures the root logger otherwise, it stays at WARNING and drops every info log. Under gunicorn the
+    # records go to its error log handlers, so they land where and how gunicorn writes its own
+    root_logger = logging.getLogger()
+    gunicorn_handlers = logging.getLogger('gunicorn.error').handlers
+    if gunicorn_handlers:
+        root_logger.handlers = list(gunicorn_handlers)
+    elif not root_logger.handlers:
+        logging.basicConfig(format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    root_logger.setLevel(log_level)
 
-india_df = get_india_df(df, vaccine_df)
 
-state_population_df = pd.read_csv('population.csv')
+configure_logging()
+boot = Boot()
 
-state_metrics_df = get_state_metrics_df(df, vaccine_df, state_population_df)
-state_metrics_df = get_modified_state_metrics_df(state_metrics_df)
 
-date_wise_metrics = get_date_wise_metrics(df, state_population_df, vaccine_df)
+def build_app(phase):
+    with phase('import_data'):
+        from artifacts import load_or_build_artifacts
+        from shared import share_frames, freeze_heap
+        from snapshot import Snapshot, SnapshotStore, start_refresher
+    with phase('import_dash'):
+        from create_app import create_app
 
-india_geojson = json.load(open("states_india.geojson", "r"))
-india_geojson = modify_geojson(india_geojson)
+    # Derived frames are memory mapped from artifacts/<hash of inputs>, run `python artifacts.py` to prebuild them
+    with phase('load_artifacts'):
+        data_version, frames = load_or_build_artifacts(served=True)
+        if preload_shared:
+            frames = share_frames(frames)
 
-moving_avg_df = date_wise_metrics.copy()
-moving_avg_df = moving_avg_df.rolling(7).mean()
+    # Callbacks and the layout read whichever snapshot is current, the refresher swaps in new data without a restart
+    with phase('snapshot'):
+        snapshot_store = SnapshotStore(Snapshot(data_version, frames))
+    with phase('create_app'):
+        app = create_app(snapshot_store)
 
-date_mask = moving_avg_df.index >= '2020-07-01'
-app = create_app(moving_avg_df[date_mask], state_metrics_df, india_df, india_geojson)
+    if refresh_interval:
+        start_refresher(snapshot_store)
 
-server = app.server
+    if preload_shared:
+        freeze_heap()
+    return app
+
+
+if lazy_boot and not preload_shared:
+    # Importing this module only builds the boot server, every worker warms the dashboard up in the background
+    app = None
+    server = BootServer(boot)
+    boot.run_in_background(build_app)
+else:
+    app = boot.run(build_app)
+    server = app.server
+    server.wsgi_app = BootServer(boot, server.wsgi_app)
 # if in_production:
 #     server = app.server
 # else:
@@ -0,0 +1,89 @@
+import functools
+import threading
+import time
+from bisect import bisect_left
+from config import metrics_enabled
+
+seconds_buckets = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+bytes_buckets = [1024 * 4 ** i for i in range(10)]
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = {name: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for name, value in labels.items()}
+    pairs = ','.join(f'{name}="{value}"' for name, value in escaped.items())
+    return f'{{{pairs}}}'
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets, label=None):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.label = label
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, label_value=None):
+        with self._lock:
+            child = self._children.get(label_value)
+            if child is None:
+                # Per bucket counts (not cumulative yet), the +Inf bucket last, then the sum
+                child = self._children[label_value] = [0] * (len(self.buckets) + 1) + [0.0]
+            child[bisect_left(self.buckets, value)] += 1
+            child[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            children = {label_value: list(child) for label_value, child in self._children.items()}
+        for label_value, child in sorted(children.items(), key=lambda item: str(item[0])):
+            labels = {self.label: label_value} if self.label else {}
+            cumulative = 0
+            for bound, count in zip(self.buckets + ['+Inf'], child[:-1]):
+                cumulative += count
+                bucket_labels = format_labels({**labels, 'le': format_value(bound)})
+                lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(labels)} {format_value(child[-1])}')
+            lines.append(f'{self.name}_count{format_labels(labels)} {cumulative}')
+        return lines
+
+
+function_seconds = Histogram('dashboard_function_seconds', 'Time spent in pipeline steps and component builders.',
+                             seconds_buckets, label='function')
+callback_seconds = Histogram('dashboard_callback_seconds', 'Time to answer a dash callback request.',
+                             seconds_buckets, label='output')
+response_bytes = Histogram('dashboard_callback_response_bytes', 'Size of the serialized callback response.',
+                           bytes_buckets, label='output')
+histograms = [function_seconds, callback_seconds, response_bytes]
+
+
+def timed(func):
+    # Decorates at import time, so with metrics off the original function is left in place and costs nothing
+    if not metrics_enabled:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            function_seconds.observe(time.perf_counter() - start, func.__name__)
+    return wrapper
+
+
+def render_metrics(values=None):
+    # Prometheus text exposition format, values maps a metric name to (counter or gauge, help text, value)
+    lines = []
+    for histogram in histograms:
+        lines.extend(histogram.render())
+    for name, (kind, documentation, value) in (values or {}).items():
+        lines.extend([f'# HELP {name} {documentation}', f'# TYPE {name} {kind}', f'{name} {format_value(value)}'])
+    return '\n'.join(lines) + '\n'
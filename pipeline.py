@@ -0,0 +1,99 @@
+import json
+import pandas as pd
+from helper import clean_raw_data, load_daily_df, modify_geojson, get_modified_state_metrics_df
+from vaccine import load_vaccine_data
+from state_level import get_state_totals_df, add_state_metrics
+from district_level import load_district_region_metrics, load_district_geojson
+from india_overall import get_india_df
+from date_wise import get_date_wise_metrics
+from geo import simplify_geojson
+from dag import run_steps
+from regions import root_region
+from config import pipeline_executor, region_metrics_source
+from metrics import timed
+
+
+def load_daily():
+    return clean_raw_data(load_daily_df('state_wise_daily.csv'))
+
+
+def load_population():
+    return pd.read_csv('population.csv')
+
+
+def load_india_geojson():
+    with open('states_india.geojson', 'r') as f:
+        india_geojson = json.load(f)
+    india_geojson = modify_geojson(india_geojson)
+    return simplify_geojson(india_geojson)
+
+
+def get_india(df, vaccine_data):
+    return get_india_df(df, vaccine_data[0])
+
+
+def get_state_totals(df, vaccine_data, state_population_df):
+    return get_state_totals_df(df, vaccine_data[0], state_population_df)
+
+
+def get_state_metrics(state_totals_df, district_region_metrics=None):
+    if district_region_metrics:
+        state_metrics_df = pd.concat([district_region_metrics['state'], district_region_metrics[root_region]])
+    else:
+        state_metrics_df = add_state_metrics(state_totals_df)
+    return get_modified_state_metrics_df(state_metrics_df)
+
+
+def get_district_metrics(district_region_metrics):
+    return district_region_metrics.get('district', pd.DataFrame())
+
+
+def get_date_wise(df, vaccine_data, state_population_df):
+    return get_date_wise_metrics(df, state_population_df, vaccine_data[0])
+
+
+# Every step only reads the results it names, so the loads and the transforms that don't depend on each other run
+# side by side. The district ones are empty / None unless the optional district inputs exist
+pipeline_steps = {
+    'vaccine_data': (load_vaccine_data, []),
+    'df': (load_daily, []),
+    'state_population_df': (load_population, []),
+    'india_geojson': (load_india_geojson, []),
+    'district_region_metrics': (load_district_region_metrics, []),
+    'district_metrics_df': (get_district_metrics, ['district_region_metrics']),
+    'district_geojson': (load_district_geojson, []),
+    'india_df': (get_india, ['df', 'vaccine_data']),
+    'state_totals_df': (get_state_totals, ['df', 'vaccine_data', 'state_population_df']),
+    'state_metrics_df': (get_state_metrics, ['state_totals_df']),
+    'date_wise_metrics': (get_date_wise, ['df', 'vaccine_data', 'state_population_df']),
+}
+
+# REGION_METRICS_SOURCE=district: the districts wait for the state totals, the states take their rows from the
+# districts' roll up
+district_pipeline_steps = dict(pipeline_steps, **{
+    'district_region_metrics': (load_district_region_metrics, ['state_totals_df']),
+    'state_metrics_df': (get_state_metrics, ['state_totals_df', 'district_region_metrics']),
+})
+
+frame_steps = ['india_df', 'state_metrics_df', 'district_metrics_df', 'date_wise_metrics', 'india_geojson',
+               'district_geojson']
+
+
+def run_pipeline(executor=pipeline_executor, source=region_metrics_source):
+    results, report = run_steps(district_pipeline_steps if source == 'district' else pipeline_steps, executor)
+    frames = {name: results[name] for name in frame_steps}
+    vaccine_df, frames['vaccine_cumulative_df'] = results['vaccine_data']
+    # CoWIN usually runs ahead of the case data, keep those days around until ingest.py can place them
+    frames['pending_vaccine_df'] = vaccine_df[vaccine_df['Date'] > results['df']['Date'].max()].reset_index(drop=True)
+    return frames, report
+
+
+@timed
+def build_frames():
+    frames, _ = run_pipeline()
+    return frames
+
+
+if __name__ == '__main__':
+    # Per step start and duration, the critical path and how far the wall time is from it
+    print(json.dumps(run_pipeline()[1], indent=2))
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+from metrics import timed
+
+root_region = 'India'
+
+# Ratios never add up, every level derives them from its own rolled up totals: (numerator, denominator, scale)
+ratio_metrics = {
+    'cases_per_million': ('Confirmed', 'population', 1000000),
+    'deaths_per_million': ('Deceased', 'population', 1000000),
+    'pct_fully_vaccinated': ('second_doses', 'population', 1),
+    'case_fatality_rate': ('Deceased', 'Confirmed', 1),
+}
+
+
+def roll_up(values, parent_codes, n_parents):
+    # Group sums of every column at once, missing values count as 0 like DataFrame.sum
+    totals = np.zeros((n_parents, values.shape[1]))
+    np.add.at(totals, parent_codes, np.nan_to_num(values))
+    return totals
+
+
+def get_ratio_values(values, columns):
+    ratios = {}
+    for metric, (numerator, denominator, scale) in ratio_metrics.items():
+        if numerator in columns and denominator in columns:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ratios[metric] = values[:, columns.index(numerator)] / values[:, columns.index(denominator)] * scale
+    return ratios
+
+
+@timed
+def get_region_metrics(leaf_df, levels, parent_totals_df=None):
+    # leaf_df holds additive totals per leaf region plus a column naming its ancestor for every level above it, levels
+    # runs from the leaves up (['district', 'state'] or just ['state']) and India sits on top of all of them. Every
+    # level is summed straight from the leaves, the ratios and their per level ranks are then computed in one pass
+    # over all levels stacked, and each level comes back as its own frame. Totals aren't ranked, nothing shows them.
+    # parent_totals_df adds totals only known from levels[1] up (a state's vaccine doses above its districts), indexed
+    # by that level's names. They are rolled up from there, the leaves don't get them
+    ancestors = leaf_df[levels[1:]]
+    columns = [column for column in leaf_df.columns if column not in levels]
+    parent_columns = []
+    if parent_totals_df is not None and len(levels) > 1:
+        parent_columns = [column for column in parent_totals_df.columns if column not in columns + levels]
+    leaf_values = leaf_df[columns].to_numpy(dtype=float)
+
+    level_values = [np.hstack([leaf_values, np.full((len(leaf_values), len(parent_columns)), np.nan)])]
+    level_indexes = [leaf_df.index]
+    level_ancestors = [ancestors]
+    for position, level in enumerate(levels[1:], start=1):
+        codes, parents = pd.factorize(ancestors[level])
+        level_indexes.append(pd.Index(parents, name=level))
+        first_leaves = np.unique(codes, return_index=True)[1]
+        level_ancestors.append(ancestors[levels[position + 1:]].iloc[first_leaves].set_index(level_indexes[-1]))
+        if position == 1 and parent_columns:
+            parent_values = parent_totals_df.reindex(index=parents, columns=parent_columns).to_numpy(dtype=float)
+        elif position == 1:
+            parent_values = np.empty((len(parents), 0))
+        else:
+            parent_codes = level_indexes[-1].get_indexer(level_ancestors[1][level])
+            parent_values = roll_up(level_values[1][:, len(columns):], parent_codes, len(parents))
+        level_values.append(np.hstack([roll_up(leaf_values, codes, len(parents)), parent_values]))
+    parent_values = level_values[1][:, len(columns):] if parent_columns else np.empty((0, 0))
+    level_values.append(np.hstack([roll_up(leaf_values, np.zeros(len(leaf_values), dtype=int), 1),
+                                   roll_up(parent_values, np.zeros(len(parent_values), dtype=int), 1)]))
+    level_indexes.append(pd.Index([root_region], name=levels[-1]))
+    level_ancestors.append(pd.DataFrame(index=level_indexes[-1]))
+
+    columns = columns + parent_columns
+    values = np.vstack(level_values)
+    stacked_df = pd.DataFrame(values, columns=columns)
+    ratios = get_ratio_values(values, columns)
+    for metric, ratio_values in ratios.items():
+        stacked_df[metric] = ratio_values
+    level_codes = np.repeat(np.arange(len(level_values)), [len(level) for level in level_values])
+    ranks_df = stacked_df[list(ratios)].groupby(level_codes).rank(method='max', ascending=False)
+    # India has nothing to be ranked against
+    ranks_df[level_codes == len(level_values) - 1] = np.nan
+    stacked_df = stacked_df.join(ranks_df.add_suffix('_rank'))
+
+    region_metrics = {}
+    bounds = np.append(0, np.cumsum([len(level) for level in level_values]))
+    for level, index, level_ancestors_df, start, end in zip(levels + [root_region], level_indexes, level_ancestors,
+                                                            bounds[:-1], bounds[1:]):
+        level_df = stacked_df.iloc[start:end].set_index(index)
+        region_metrics[level] = pd.concat([level_ancestors_df.set_index(index), level_df], axis=1)
+    # The leaves carry neither the parent totals nor the ratios built on them
+    leaf_only = [metric for metric, (numerator, denominator, _) in ratio_metrics.items()
+                 if metric in ratios and (numerator in parent_columns or denominator in parent_columns)]
+    region_metrics[levels[0]] = region_metrics[levels[0]].drop(
+        columns=parent_columns + leaf_only + [metric + '_rank' for metric in leaf_only])
+    return region_metrics
@@ -0,0 +1,40 @@
+import threading
+from collections import OrderedDict
+from config import render_cache_size
+
+
+class RenderCache:
+    def __init__(self, maxsize=render_cache_size):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_render(self, key, render):
+        value = self.get(key)
+        if value is None:
+            # Rendering happens outside the lock, two threads missing on the same key just both render it
+            value = render()
+            self.put(key, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'maxsize': self.maxsize}
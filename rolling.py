@@ -0,0 +1,81 @@
+import numpy as np
+from config import avg_days_to_death, moving_avg_windows
+from metrics import timed
+
+# Daily counts, the only metrics whose week over week growth and doubling time mean anything
+count_metrics = ['Confirmed', 'Deceased', 'Recovered', 'vaccinations', 'first_doses', 'second_doses']
+
+# Ratios of window sums instead of means of the daily ratios: (numerator, denominator, days the denominator lags)
+window_ratio_metrics = {
+    'window_case_fatality_rate': ('Deceased', 'Confirmed', avg_days_to_death),
+    'second_dose_share': ('second_doses', 'vaccinations', 0),
+}
+
+growth_days = 7
+growth_stats = ['week_over_week', 'doubling_days']
+
+
+def shift_days(values, days):
+    if days == 0:
+        return values
+    shifted = np.full_like(values, np.nan)
+    shifted[..., days:] = values[..., :-days]
+    return shifted
+
+
+def get_running_totals(values):
+    # Along the day axis, with a leading 0 so the sum of the days (t - window, t] is totals[t + 1] - totals[t + 1 - window].
+    # Missing days count as 0 in the totals and are counted on their own
+    missing = np.isnan(values)
+    first = np.zeros(values.shape[:-1] + (1,))
+    totals = np.concatenate([first, np.cumsum(np.where(missing, 0, values), axis=-1)], axis=-1)
+    missing_counts = np.concatenate([first, np.cumsum(missing, axis=-1)], axis=-1)
+    return totals, missing_counts
+
+
+def get_window_sums(totals, missing_counts, window):
+    # NaN until window days are in and wherever one of them is missing, like rolling(window).sum()
+    sums = np.full(totals.shape[:-1] + (totals.shape[-1] - 1,), np.nan)
+    complete = missing_counts[..., window:] == missing_counts[..., :-window]
+    sums[..., window - 1:] = np.where(complete, totals[..., window:] - totals[..., :-window], np.nan)
+    return sums
+
+
+@timed
+def get_window_stats(values, metrics, windows=moving_avg_windows):
+    # values is (metric, region, day) of daily values. One set of running totals gives the mean of every window for
+    # every metric, the window_ratio_metrics and, for the counts, the week over week growth of their weekly sums and
+    # the doubling time of their cumulative totals at that growth. Returns a (stat, metric, region, day) array, stat 0
+    # being the raw values, then the windows and the growth_stats, and its metrics, the ratio metrics appended
+    codes = {metric: code for code, metric in enumerate(metrics)}
+    ratio_metrics = [metric for metric, (numerator, denominator, _) in window_ratio_metrics.items()
+                     if numerator in codes and denominator in codes]
+    counts = [codes[metric] for metric in count_metrics if metric in codes]
+    totals, missing_counts = get_running_totals(values)
+
+    stats = np.full((1 + len(windows) + len(growth_stats), len(metrics) + len(ratio_metrics)) + values.shape[1:],
+                    np.nan)
+    stats[0, :len(metrics)] = values
+    window_sums = {1: values}
+    for position, window in enumerate(windows, start=1):
+        window_sums[window] = get_window_sums(totals, missing_counts, window)
+        stats[position, :len(metrics)] = window_sums[window] / window
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for code, metric in enumerate(ratio_metrics, start=len(metrics)):
+            numerator, denominator, lag = window_ratio_metrics[metric]
+            for position, window in enumerate([1] + windows):
+                sums = window_sums[window]
+                stats[position, code] = sums[codes[numerator]] / shift_days(sums[codes[denominator]], lag)
+
+        weekly = window_sums.get(growth_days)
+        if weekly is None:
+            weekly = get_window_sums(totals, missing_counts, growth_days)
+        weekly = weekly[counts]
+        stats[-2, counts] = weekly / shift_days(weekly, growth_days) - 1
+        cumulative = totals[counts, :, 1:]
+        growth = cumulative / shift_days(cumulative, growth_days)
+        # Totals that aren't growing never double
+        stats[-1, counts] = np.where(growth > 1, growth_days * np.log(2) / np.log(growth), np.nan)
+    stats[~np.isfinite(stats)] = np.nan
+    return stats, metrics + ratio_metrics
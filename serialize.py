@@ -0,0 +1,45 @@
+import json
+import numpy as np
+import plotly
+from config import json_engine
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FigureJSONEncoder(plotly.utils.PlotlyJSONEncoder):
+    def default(self, obj):
+        # Plotly's encoder writes datetime64 arrays as integer nanoseconds
+        if isinstance(obj, np.ndarray) and obj.dtype.kind == 'M':
+            return np.datetime_as_string(obj, unit='s').tolist()
+        # and float32 ones with every digit of the float64 they widen to, orjson keeps float32's shortest repr
+        if isinstance(obj, np.ndarray) and obj.dtype == np.float32:
+            return [float(str(value)) for value in obj.tolist()]
+        return super().default(obj)
+
+
+figure_encoder = FigureJSONEncoder()
+
+
+def dumps_plotly(obj):
+    return json.dumps(obj, cls=FigureJSONEncoder)
+
+
+def dumps_orjson(obj):
+    # Plain dicts, lists and contiguous numpy arrays are encoded natively, components, pandas objects and the rest
+    # go through the plotly encoder's conversions
+    return orjson.dumps(obj, default=figure_encoder.default, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+
+serializers = {'plotly': dumps_plotly, 'orjson': dumps_orjson}
+
+
+def get_serializer(engine=json_engine):
+    if engine == 'orjson' and orjson is None:
+        engine = 'plotly'
+    return serializers[engine]
+
+
+dumps = get_serializer()
@@ -0,0 +1,80 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from config import moving_avg_windows
+from rolling import get_window_stats, growth_stats
+from metrics import timed
+
+# Everything plotted or shipped per region, population is constant and only ever used to derive these
+series_metrics = ['Confirmed', 'Deceased', 'Recovered', 'vaccinations', 'first_doses', 'second_doses',
+                  'cases_per_million', 'deaths_per_million', 'pct_fully_vaccinated', 'case_fatality_rate']
+
+
+class SeriesStore:
+    # One float32 array shaped (window, metric, region, day): window 1 is the raw series, every other window its
+    # trailing mean (a ratio of window sums for the window ratio metrics), followed by the growth stats by name. The day
+    # axis is innermost, so each series is a contiguous run and a lookup is a view, never a copy
+    def __init__(self, values, dates, windows, metrics, regions):
+        self.values = values
+        self.dates = dates
+        self.windows = {window: code for code, window in enumerate(windows)}
+        self.metrics = {metric: code for code, metric in enumerate(metrics)}
+        self.regions = {region: code for code, region in enumerate(regions)}
+
+    def series(self, metric, region, window):
+        return self.values[self.windows[window], self.metrics[metric], self.regions[region]]
+
+    def metric_values(self, metric, window):
+        # (region, day) for every region at once
+        return self.values[self.windows[window], self.metrics[metric]]
+
+    def region_values(self, region, window):
+        # (metric, day) for one region
+        return self.values[self.windows[window], :, self.regions[region]]
+
+    def since(self, start_date):
+        # The days from start_date on, over a view of the same values
+        first_day = self.dates.searchsorted(pd.Timestamp(start_date))
+        return SeriesStore(self.values[..., first_day:], self.dates[first_day:], self.windows, self.metrics,
+                           self.regions)
+
+    def __contains__(self, region):
+        return region in self.regions
+
+
+@timed
+def build_series_store(india_df, date_wise_metrics, metrics=series_metrics, windows=moving_avg_windows):
+    # india_df has one column per metric, date_wise_metrics (metric, state) columns. Every stat is computed over the
+    # whole history in one pass and kept for all of it, the plots take a view from their first day. India is stored as
+    # region 0
+    dates = date_wise_metrics.index.union(india_df.index)
+    states = list(date_wise_metrics[metrics[0]].columns)
+    regions = ['India'] + states
+
+    values = np.empty((len(metrics), len(regions), len(dates)))
+    india_df = india_df.reindex(dates)
+    state_df = date_wise_metrics.reindex(dates)
+    for metric_code, metric in enumerate(metrics):
+        values[metric_code, 0] = india_df[metric].to_numpy()
+        values[metric_code, 1:] = state_df[metric][states].to_numpy().T
+    stats, stat_metrics = get_window_stats(values, metrics, windows)
+    return SeriesStore(stats.astype(np.float32), pd.DatetimeIndex(dates, name='Date'), [1] + windows + growth_stats,
+                       stat_metrics, regions)
+
+
+def save_series_store(store, path):
+    os.makedirs(path)
+    np.save(os.path.join(path, 'values.npy'), np.ascontiguousarray(store.values))
+    np.save(os.path.join(path, 'dates.npy'), store.dates.values)
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump({'windows': list(store.windows), 'metrics': list(store.metrics), 'regions': list(store.regions)}, f)
+
+
+def load_series_store(path):
+    # Memory mapped, so every worker reads the values from the same page cache pages
+    with open(os.path.join(path, 'meta.json'), 'r') as f:
+        meta = json.load(f)
+    return SeriesStore(np.load(os.path.join(path, 'values.npy'), mmap_mode='r'),
+                       pd.DatetimeIndex(np.load(os.path.join(path, 'dates.npy')), name='Date'),
+                       meta['windows'], meta['metrics'], meta['regions'])
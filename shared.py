@@ -0,0 +1,71 @@
+import gc
+import mmap
+import numpy as np
+import pandas as pd
+
+
+def split_blocks(df):
+    # (column positions, 2-D values shaped (n_columns, n_rows)) for every dtype in the frame. A dtype whose columns are
+    # next to each other comes back as a view of the frame's own array
+    groups = {}
+    for position, dtype in enumerate(df.dtypes.tolist()):
+        groups.setdefault(dtype, []).append(position)
+    blocks = []
+    for positions in groups.values():
+        if positions[-1] - positions[0] == len(positions) - 1:
+            values = df.iloc[:, positions[0]:positions[-1] + 1].to_numpy()
+        else:
+            values = df.iloc[:, positions].to_numpy()
+        blocks.append((positions, values.T))
+    return blocks
+
+
+def frame_from_blocks(blocks, index, columns):
+    # Inverse of split_blocks, one frame per block over its array as-is, put side by side without copying so memory
+    # mapped / shared pages stay that way. Only a frame whose dtypes interleave has its columns put back in order with
+    # a copy
+    frames = [pd.DataFrame(values.T, index=index, copy=False) for _, values in blocks]
+    df = pd.concat(frames, axis=1, copy=False) if frames else pd.DataFrame(index=index)
+    positions = [position for block_positions, _ in blocks for position in block_positions]
+    if positions != list(range(len(positions))):
+        df = df.iloc[:, np.argsort(positions)]
+    df.columns = columns
+    return df
+
+
+def is_file_backed(values):
+    while values is not None:
+        if isinstance(values, np.memmap):
+            return True
+        values = values.base
+    return False
+
+
+def share_array(values):
+    # Anonymous mmaps are MAP_SHARED, so forked gunicorn workers see the master's pages instead of copies
+    buffer = mmap.mmap(-1, max(values.nbytes, 1))
+    shared = np.frombuffer(buffer, dtype=values.dtype, count=values.size).reshape(values.shape)
+    shared[...] = values
+    shared.flags.writeable = False
+    return shared
+
+
+def share_frame(df):
+    blocks = []
+    for positions, values in split_blocks(df):
+        # Object columns can't live outside the Python heap and file backed blocks are already shared via the page cache
+        if values.dtype != object and not is_file_backed(values):
+            values = share_array(values)
+        blocks.append((positions, values))
+    return frame_from_blocks(blocks, df.index, df.columns)
+
+
+def share_frames(frames):
+    return {name: share_frame(frame) if isinstance(frame, pd.DataFrame) else frame
+            for name, frame in frames.items()}
+
+
+def freeze_heap():
+    # Keep the garbage collector from touching (and so copying) the master's objects in every worker
+    gc.collect()
+    gc.freeze()
@@ -0,0 +1,161 @@
+import logging
+import os
+import threading
+import time
+from artifacts import build_artifacts_once, load_built_artifacts, get_input_hash
+from config import artifacts_dir, input_files, optional_input_files, moving_avg_days, plot_max_points, \
+    plot_start_date, preload_shared, refresh_interval
+from downsample import get_plot_rows
+from series_store import build_series_store
+from shared import share_array, is_file_backed
+from geo import encode_geojson, get_geojson_asset_name
+from kpi_table import get_kpi_table, get_kpi_texts
+
+logger = logging.getLogger(__name__)
+
+
+class Snapshot:
+    def __init__(self, version, frames):
+        self.version = version
+        # date_wise_metrics is only ever needed to build the series store, it isn't kept
+        self.frames = {name: frame for name, frame in frames.items() if name != 'date_wise_metrics'}
+        self.india_df = frames['india_df']
+        self.state_metrics_df = frames['state_metrics_df']
+        self.india_geojson = frames['india_geojson']
+        self.geojson_encoded = frames.get('india_geojson_encoded') or encode_geojson(self.india_geojson)
+        self.geojson_name = get_geojson_asset_name(self.geojson_encoded)
+        # Every KPI card string, formatted once here so rendering a card is a lookup
+        self.kpi_table = get_kpi_table(self.state_metrics_df)
+        self.kpi_texts = get_kpi_texts(self.kpi_table)
+        self.district_metrics_df = frames['district_metrics_df']
+        # Every level the map can switch to: (metrics, geojson asset name, encoded geojson)
+        self.map_levels = {'state': (self.state_metrics_df, self.geojson_name, self.geojson_encoded)}
+        district_geojson = frames.get('district_geojson')
+        if district_geojson is not None and 'deaths_per_million' in self.district_metrics_df:
+            district_geojson_encoded = frames.get('district_geojson_encoded') or encode_geojson(district_geojson)
+            self.map_levels['district'] = (self.district_metrics_df,
+                                           get_geojson_asset_name(district_geojson_encoded, 'districts_india'),
+                                           district_geojson_encoded)
+        # Every series, its moving averages and growth stats are computed once per snapshot, never per request, into a
+        # single float32 store of the whole history. The API serves all of it, the plots the days from plot_start_date.
+        # It is built with the artifacts and mapped from them, frames handed over in memory get theirs built here
+        self.history = frames.get('series_store') or build_series_store(self.india_df, frames['date_wise_metrics'])
+        if preload_shared and not is_file_backed(self.history.values):
+            # Built in the gunicorn master before the fork, so every worker reads the same pages
+            self.history.values = share_array(self.history.values)
+        self.series = self.history.since(plot_start_date)
+        self.plot_rows = get_plot_rows(self.series, moving_avg_days, plot_max_points)
+        self.last_updated = get_last_updated(self.history.dates, frames['pending_vaccine_df'])
+        # Anything derived once per snapshot (layout, rendered responses, ...) lives here and dies with it
+        self.cache = {}
+
+
+def get_last_updated(dates, pending_vaccine_df):
+    last_updated = dates.max()
+    if not pending_vaccine_df.empty:
+        last_updated = max(last_updated, pending_vaccine_df['Date'].max())
+    return last_updated
+
+
+class SnapshotStore:
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+        self._preparers = []
+
+    def get(self):
+        return self._snapshot
+
+    def add_preparer(self, preparer):
+        self._preparers.append(preparer)
+        preparer(self._snapshot)
+
+    def swap(self, snapshot):
+        # Requests keep reading the old snapshot until the new one is fully prepared, then a single
+        # reference assignment (atomic under the GIL) switches every later request over
+        for preparer in self._preparers:
+            preparer(snapshot)
+        self._snapshot = snapshot
+
+
+def get_input_signature():
+    paths = input_files + optional_input_files + [artifacts_dir]
+    return tuple((os.stat(path).st_mtime_ns, os.stat(path).st_size) if os.path.exists(path) else None
+                 for path in paths)
+
+
+def get_unsettled_inputs(interval):
+    # Inputs written to within the last interval may still be being written, they are built from on a later check
+    now = time.time()
+    return [path for path in input_files + optional_input_files
+            if os.path.exists(path) and now - os.stat(path).st_mtime < interval]
+
+
+def watch_inputs(interval, refresh):
+    # Calls refresh whenever the inputs or the artifact store change, and again on every later check until it
+    # returns True. A refresh that raises waits for the next change
+    signature = get_input_signature()
+    while True:
+        time.sleep(interval)
+        new_signature = get_input_signature()
+        if new_signature == signature:
+            continue
+        previous_signature, signature = signature, new_signature
+        try:
+            if not refresh():
+                signature = previous_signature
+        except Exception:
+            logger.exception('Data refresh failed')
+
+
+def build_settled_artifacts(interval):
+    # The version saved or None, while an input is still settling or another process holds the build lock
+    unsettled = get_unsettled_inputs(interval)
+    if unsettled:
+        logger.info('Waiting for %s to settle before building', ', '.join(unsettled))
+        return None
+    return build_artifacts_once()
+
+
+class DataRefresher(threading.Thread):
+    # With build=False it only ever maps artifacts another process built, see builder.py
+    def __init__(self, store, interval=refresh_interval, build=True):
+        super().__init__(name='data-refresher', daemon=True)
+        self.store = store
+        self.interval = interval
+        self.build = build
+
+    def refresh(self):
+        # True once the store serves the current inputs, False while they settle or another process builds them
+        version = get_input_hash()
+        if version == self.store.get().version:
+            return True
+        frames = load_built_artifacts(version)
+        if frames is None:
+            built = build_settled_artifacts(self.interval) if self.build else None
+            if built is None:
+                return False
+            version, frames = built
+        self.store.swap(Snapshot(version, frames))
+        logger.info('Swapped in data snapshot %s', version)
+        return True
+
+    def run(self):
+        watch_inputs(self.interval, self.refresh)
+
+
+# Stores whose refresher waits for gunicorn to fork a worker, see gunicorn.conf.py
+worker_refreshers = []
+
+
+def start_refresher(store, interval=refresh_interval):
+    if preload_shared:
+        # Threads don't survive gunicorn's fork, every worker starts its own from the post_fork hook. The master's
+        # builder process builds new artifacts, so a rebuild never competes with requests for a worker's GIL
+        worker_refreshers.append((store, interval))
+    else:
+        DataRefresher(store, interval).start()
+
+
+def start_worker_refreshers():
+    for store, interval in worker_refreshers:
+        DataRefresher(store, interval, build=False).start()
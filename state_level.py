@@ -2,9 +2,12 @@ import pandas as pd
 from vaccine import get_state_vaccine_totals_df
 from datetime import timedelta
 from config import avg_days_to_death
+from regions import get_region_metrics, root_region
+from metrics import timed
 
 
-def get_state_metrics_df(df, vaccine_df, state_population_df):
+@timed
+def get_state_totals_df(df, vaccine_df, state_population_df):
     state_vaccine_totals_df = get_state_vaccine_totals_df(vaccine_df)
 
     max_date = df['Date'].max()
@@ -22,19 +25,14 @@ def get_state_metrics_df(df, vaccine_df, state_population_df):
     state_metrics_df = pd.merge(state_metrics_df, state_vaccine_totals_df, on='state')
     state_metrics_df.set_index('state', inplace=True)
 
-    state_metrics_df['cases_per_million'] = state_metrics_df['Confirmed'] / state_metrics_df['population'] * 1000000
-    state_metrics_df['deaths_per_million'] = state_metrics_df['Deceased'] / state_metrics_df['population'] * 1000000
-    state_metrics_df['pct_fully_vaccinated'] = state_metrics_df['second_doses'] / state_metrics_df['population']
-    state_metrics_df['case_fatality_rate'] = state_metrics_df['Deceased'] / state_metrics_df['Confirmed']
+    return state_metrics_df
 
-    for metric in state_metrics_df:
-        state_metrics_df[f"{metric}_rank"] = state_metrics_df[metric].rank(method='max', ascending=False)
 
-    state_metrics_df.loc["India"] = state_metrics_df.sum()
+def get_state_metrics_df(df, vaccine_df, state_population_df):
+    return add_state_metrics(get_state_totals_df(df, vaccine_df, state_population_df))
 
-    state_metrics_df['cases_per_million'] = state_metrics_df['Confirmed'] / state_metrics_df['population'] * 1000000
-    state_metrics_df['deaths_per_million'] = state_metrics_df['Deceased'] / state_metrics_df['population'] * 1000000
-    state_metrics_df['pct_fully_vaccinated'] = state_metrics_df['second_doses'] / state_metrics_df['population']
-    state_metrics_df['case_fatality_rate'] = state_metrics_df['Deceased'] / state_metrics_df['Confirmed']
 
-    return state_metrics_df
\ No newline at end of file
+def add_state_metrics(state_metrics_df):
+    # States are the leaves of the region hierarchy, India their only parent
+    region_metrics = get_region_metrics(state_metrics_df, ['state'])
+    return pd.concat([region_metrics['state'], region_metrics[root_region]])
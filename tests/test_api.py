@@ -0,0 +1,137 @@
+import io
+import json
+import os
+import flask
+import numpy as np
+import pandas as pd
+import pytest
+import api
+import pipeline
+from snapshot import Snapshot, SnapshotStore
+
+package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='module')
+def frames():
+    cwd = os.getcwd()
+    os.chdir(package_dir)
+    try:
+        return pipeline.run_pipeline('serial')[0]
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture
+def store(frames):
+    return SnapshotStore(Snapshot('v1', frames))
+
+
+@pytest.fixture
+def client(store):
+    server = flask.Flask(__name__)
+    server.register_blueprint(api.create_api(store), url_prefix='/api/v1')
+    return server.test_client()
+
+
+def get_json(client, url, status=200):
+    response = client.get(url)
+    assert response.status_code == status, response.data
+    return json.loads(response.data)
+
+
+def test_states(client, store):
+    body = get_json(client, '/api/v1/states')
+    assert body['total'] == len(store.get().state_metrics_df) == 34
+    assert body['next'] is None
+    assert body['data'][0]['state'] == store.get().state_metrics_df.index[0]
+
+
+def test_region_filters_and_fields(client, store):
+    body = get_json(client, '/api/v1/states?regions=Kerala,India&fields=Confirmed,deaths_per_million')
+    state_metrics_df = store.get().state_metrics_df
+    assert body['total'] == 2
+    assert body['data'] == [{'state': region, 'Confirmed': state_metrics_df.loc[region, 'Confirmed'],
+                             'deaths_per_million': state_metrics_df.loc[region, 'deaths_per_million']}
+                            for region in ['Kerala', 'India']]
+    assert get_json(client, '/api/v1/states?fields=')['data'][0] == {'state': state_metrics_df.index[0]}
+    assert get_json(client, '/api/v1/districts') == {'total': 0, 'offset': 0, 'limit': 1000, 'next': None, 'data': []}
+
+
+def test_series(client, store):
+    history = store.get().history
+    body = get_json(client, '/api/v1/series/Kerala?window=7&start=2021-03-01&end=2021-03-10&fields=Confirmed')
+    assert body['total'] == 10
+    assert body['data'][0]['Date'] == '2021-03-01' and body['data'][-1]['Date'] == '2021-03-10'
+    expected = history.series('Confirmed', 'Kerala', 7)[history.dates.get_loc(pd.Timestamp('2021-03-01'))]
+    # The stored float32, written with its own shortest repr
+    assert body['data'][0]['Confirmed'] == float(str(expected))
+    assert get_json(client, '/api/v1/series/India')['total'] == len(history.dates)
+    assert get_json(client, '/api/v1/series/India?start=2021-06-01&end=2021-05-01')['total'] == 0
+
+
+def test_pagination(client):
+    body = get_json(client, '/api/v1/states?limit=10&offset=30&fields=population')
+    assert body['total'] == 34 and len(body['data']) == 4 and body['next'] is None
+    response = client.get('/api/v1/states?limit=10&fields=population')
+    body = json.loads(response.data)
+    assert len(body['data']) == 10
+    assert body['next'] == 'http://localhost/api/v1/states?limit=10&fields=population&offset=10'
+    assert response.headers['Link'] == f'<{body["next"]}>; rel="next"'
+    assert response.headers['X-Total-Count'] == '34'
+    assert get_json(client, '/api/v1/states?offset=1000')['data'] == []
+
+
+def test_streamed_pages(client, store, monkeypatch):
+    # Pages longer than a chunk are streamed in several pieces that still add up to one document
+    monkeypatch.setattr(api, 'stream_chunk_rows', 7)
+    response = client.get('/api/v1/states?fields=Confirmed')
+    assert response.is_streamed
+    body = json.loads(response.data)
+    assert [row['state'] for row in body['data']] == list(store.get().state_metrics_df.index)
+
+    response = client.get('/api/v1/series/Goa?format=csv&fields=Confirmed,Deceased&start=2021-01-01&end=2021-01-20')
+    assert response.mimetype == 'text/csv'
+    csv_df = pd.read_csv(io.BytesIO(response.data), index_col='Date', parse_dates=True)
+    assert list(csv_df.columns) == ['Confirmed', 'Deceased'] and len(csv_df) == 20
+    history = store.get().history
+    first_day = history.dates.get_loc(pd.Timestamp('2021-01-01'))
+    np.testing.assert_allclose(csv_df['Deceased'], history.series('Deceased', 'Goa', 1)[first_day:first_day + 20],
+                               rtol=1e-6)
+    empty = client.get('/api/v1/states?format=csv&fields=Confirmed&offset=100')
+    assert empty.data.decode().strip() == 'state,Confirmed'
+
+
+def test_etag(client, store, frames):
+    response = client.get('/api/v1/states?fields=Confirmed')
+    etag = response.headers['ETag']
+    assert response.headers['Cache-Control'] == 'no-cache'
+    not_modified = client.get('/api/v1/states?fields=Confirmed', headers={'If-None-Match': etag})
+    assert not_modified.status_code == 304 and not_modified.data == b''
+    # A compressed copy is still current
+    compressed = client.get('/api/v1/states?fields=Confirmed', headers={'If-None-Match': etag[:-1] + ':gzip"'})
+    assert compressed.status_code == 304
+    assert client.get('/api/v1/states?fields=Deceased', headers={'If-None-Match': etag}).status_code == 200
+
+    store.swap(Snapshot('v2', frames))
+    assert client.get('/api/v1/states?fields=Confirmed', headers={'If-None-Match': etag}).status_code == 200
+
+
+@pytest.mark.parametrize('url, status, message', [
+    ('/api/v1/states?regions=Atlantis', 404, 'Unknown regions Atlantis'),
+    ('/api/v1/series/Atlantis', 404, 'Unknown region Atlantis'),
+    ('/api/v1/states?fields=Confirmed,nope', 400, 'Unknown fields nope'),
+    ('/api/v1/states?limit=abc', 400, 'limit must be an integer'),
+    ('/api/v1/states?offset=-1', 400, 'offset must not be negative'),
+    ('/api/v1/states?limit=10001', 400, 'limit must not be more than 10000'),
+    ('/api/v1/states?format=xml', 400, 'format must be one of json, csv'),
+    ('/api/v1/series/Kerala?window=5', 400, 'window must be one of 1, 7, 14, 28'),
+    ('/api/v1/series/Kerala?start=', 400, 'start must be a date (YYYY-MM-DD)'),
+    ('/api/v1/series/Kerala?end=soon', 400, 'end must be a date (YYYY-MM-DD)'),
+])
+def test_errors(client, url, status, message):
+    response = client.get(url)
+    assert response.status_code == status
+    assert response.mimetype == 'application/json'
+    assert json.loads(response.data)['error'].startswith(message)
+    assert 'ETag' not in response.headers
@@ -0,0 +1,109 @@
+import threading
+import time
+import pytest
+from dag import get_step_order, get_critical_path, run_steps
+
+
+def get_steps(log=None):
+    # a and b feed c, c and d feed e
+    def step(name, value):
+        def func(*inputs):
+            if log is not None:
+                log.append(name)
+            return value + sum(inputs)
+        return func
+    return {
+        'e': (step('e', 10000), ['c', 'd']),
+        'c': (step('c', 100), ['a', 'b']),
+        'a': (step('a', 1), []),
+        'b': (step('b', 10), []),
+        'd': (step('d', 1000), []),
+    }
+
+
+def test_step_order():
+    steps = get_steps()
+    order = get_step_order(steps)
+    assert sorted(order) == sorted(steps)
+    for name, (_, inputs) in steps.items():
+        assert all(order.index(input_name) < order.index(name) for input_name in inputs)
+
+
+def test_step_order_errors():
+    with pytest.raises(ValueError, match="Step c takes z, which isn't a step"):
+        get_step_order({'c': (None, ['z'])})
+    with pytest.raises(ValueError, match='Steps form a cycle: a -> b -> c -> a'):
+        get_step_order({'a': (None, ['b']), 'b': (None, ['c']), 'c': (None, ['a'])})
+
+
+@pytest.mark.parametrize('executor', ['thread', 'serial'])
+def test_run_steps(executor):
+    log = []
+    results, report = run_steps(get_steps(log), executor, max_workers=3)
+
+    assert results == {'a': 1, 'b': 10, 'c': 111, 'd': 1000, 'e': 11111}
+    assert log.index('c') > max(log.index('a'), log.index('b'))
+    assert log.index('e') > max(log.index('c'), log.index('d'))
+    steps = report['steps']
+    assert steps['c']['start'] >= max(steps[name]['start'] + steps[name]['seconds'] for name in ['a', 'b'])
+    assert report['executor'] == executor and report['workers'] == (1 if executor == 'serial' else 3)
+
+
+def test_independent_steps_run_side_by_side():
+    # Both steps only get past the barrier if they run at the same time
+    barrier = threading.Barrier(2, timeout=5)
+    steps = {'a': (barrier.wait, []), 'b': (barrier.wait, []), 'c': (lambda a, b: 'done', ['a', 'b'])}
+    assert run_steps(steps, 'thread', max_workers=2)[0]['c'] == 'done'
+
+
+def test_max_workers():
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def step():
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+
+    run_steps({name: (step, []) for name in 'abcdef'}, 'thread', max_workers=2)
+    assert peak[0] == 2
+
+
+def test_critical_path():
+    steps = {'slow': (None, []), 'fast': (None, []), 'join': (None, ['slow', 'fast']), 'tail': (None, ['fast'])}
+    seconds = {'slow': 3, 'fast': 1, 'join': 1, 'tail': 2}
+    assert get_critical_path(steps, get_step_order(steps), seconds) == ['slow', 'join']
+
+
+@pytest.mark.parametrize('executor', ['thread', 'serial'])
+def test_failure_propagates(executor):
+    log = []
+    steps = get_steps(log)
+
+    def fail(a, b):
+        raise KeyError('missing column')
+    steps['c'] = (fail, ['a', 'b'])
+
+    with pytest.raises(KeyError, match='missing column'):
+        run_steps(steps, executor, max_workers=3)
+    # Nothing that takes the failed step's result runs
+    assert 'e' not in log
+
+
+def test_failure_stops_pending_steps():
+    log = []
+    steps = {
+        'fails': (lambda: 1 / 0, []),
+        'later': (lambda: log.append('later'), []),
+    }
+    with pytest.raises(ZeroDivisionError):
+        run_steps(steps, 'serial')
+    assert log == []
+
+
+def test_unknown_executor():
+    with pytest.raises(ValueError, match='Pipeline executor must be one of thread, serial, not process'):
+        run_steps(get_steps(), 'process')
@@ -0,0 +1,30 @@
+import os
+import pandas as pd
+import pytest
+import pipeline
+from date_wise import get_date_wise_metrics, get_date_wise_metrics_pandas
+from vaccine import load_vaccine_data
+
+package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='module')
+def inputs():
+    cwd = os.getcwd()
+    os.chdir(package_dir)
+    try:
+        return pipeline.load_daily(), pipeline.load_population(), load_vaccine_data()[0]
+    finally:
+        os.chdir(cwd)
+
+
+# The whole history, a cut from before the vaccine data starts and one ending in the middle of it
+@pytest.mark.parametrize('last_day', [None, '2020-09-30', '2021-02-15'])
+def test_engines_agree(inputs, last_day):
+    df, state_population_df, vaccine_df = inputs
+    if last_day is not None:
+        df = df[df['Date'] <= last_day]
+        vaccine_df = vaccine_df[vaccine_df['Date'] <= last_day]
+    expected = get_date_wise_metrics_pandas(df, state_population_df, vaccine_df)
+    pd.testing.assert_frame_equal(get_date_wise_metrics(df, state_population_df, vaccine_df), expected,
+                                  check_dtype=False, check_freq=False)
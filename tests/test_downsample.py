@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+from config import plot_max_points
+from downsample import lttb_rows, get_series_rows, get_plot_rows, get_range_rows
+from series_store import SeriesStore
+
+dates = pd.date_range('2020-07-01', periods=400)
+
+
+def get_x(n):
+    return np.arange(n, dtype=float)
+
+
+def test_keeps_first_and_last_rows():
+    rng = np.random.default_rng(0)
+    y = rng.normal(size=(400, 3)).cumsum(axis=0)
+    rows = lttb_rows(get_x(400), y, 50)
+
+    assert rows.shape == (50, 3)
+    assert (rows[0] == 0).all() and (rows[-1] == 399).all()
+    assert (np.diff(rows, axis=0) > 0).all()
+
+
+def test_keeps_spikes():
+    y = np.zeros((400, 1))
+    y[123] = 100
+    y[301] = -50
+    rows = lttb_rows(get_x(400), y, 20)[:, 0]
+    assert 123 in rows and 301 in rows
+
+
+def test_short_series_pass_through():
+    y = np.arange(40, dtype=float)[:, None]
+    for max_points in [40, 150, 0]:
+        assert (lttb_rows(get_x(40), y, max_points)[:, 0] == np.arange(40)).all()
+    assert (lttb_rows(get_x(2), y[:2], 1)[:, 0] == [0, 1]).all()
+    # Fewer than three points can't keep both ends and anything in between
+    rows = lttb_rows(get_x(40), y, 2)[:, 0]
+    assert len(rows) == 3 and rows[0] == 0 and rows[-1] == 39
+
+
+def test_nan_gaps():
+    y = np.sin(np.arange(400) / 10.)[:, None].repeat(2, axis=1)
+    # A gap much wider than a bucket in the first series, scattered missing days in the second
+    y[100:200, 0] = np.nan
+    y[::3, 1] = np.nan
+    rows = lttb_rows(get_x(400), y, 40)
+
+    gap_rows = rows[:, 0][(rows[:, 0] >= 100) & (rows[:, 0] < 200)]
+    # Every bucket inside the gap keeps a missing row, so the plotted line breaks there instead of bridging it
+    assert len(gap_rows) and np.isnan(y[gap_rows, 0]).all()
+    outside = rows[:, 0][(rows[:, 0] < 100) | (rows[:, 0] >= 200)]
+    assert not np.isnan(y[outside, 0]).any()
+    # Buckets with some values never pick a missing one
+    assert not np.isnan(y[rows[1:-1, 1], 1]).any()
+
+
+def test_plot_rows_respect_plot_max_points():
+    values = np.random.default_rng(1).normal(size=(2, 2, 3, len(dates))).astype(np.float32)
+    store = SeriesStore(values, dates, [1, 7], ['Confirmed', 'Deceased'], ['India', 'Kerala', 'Goa'])
+    rows = get_plot_rows(store, 7, plot_max_points)
+
+    assert rows.shape == (2, 3, min(plot_max_points, len(dates)) if plot_max_points else len(dates))
+    assert (rows[..., 0] == 0).all() and (rows[..., -1] == len(dates) - 1).all()
+    assert (get_series_rows(dates, values[1, 0], 1000) == np.arange(len(dates))).all()
+
+
+def test_range_rows():
+    rows = get_range_rows(dates, '2020-08-01', '2020-08-10')
+    assert dates[rows[0]] == pd.Timestamp('2020-07-31') and dates[rows[-1]] == pd.Timestamp('2020-08-11')
+    assert (get_range_rows(dates, '2020-01-01', '2020-07-02') == [0, 1, 2]).all()
+    assert get_range_rows(dates, '2022-01-01', '2022-02-01')[-1] == len(dates) - 1
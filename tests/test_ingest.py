@@ -0,0 +1,56 @@
+import os
+import shutil
+import pandas as pd
+import pytest
+import ingest
+import pipeline
+
+package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+daily_path = 'state_wise_daily.csv'
+vaccine_path = 'cowin_vaccine_data_statewise.csv'
+
+
+def split_rows(path, get_date, last_stored_day, last_new_day):
+    with open(os.path.join(package_dir, path), 'r') as f:
+        header, *rows = f.read().rstrip('\n').split('\n')
+    dates = [get_date(row) for row in rows]
+    stored = [row for row, date in zip(rows, dates) if date <= pd.Timestamp(last_stored_day)]
+    new = [row for row, date in zip(rows, dates)
+           if pd.Timestamp(last_stored_day) < date <= pd.Timestamp(last_new_day)]
+    return header, stored, new
+
+
+def write_rows(path, header, rows):
+    with open(path, 'w') as f:
+        f.write('\n'.join([header] + rows) + '\n')
+
+
+@pytest.fixture
+def pre_vaccine_inputs(tmp_path, monkeypatch):
+    # Case data up to 2021-01-05 and CoWIN data (which starts on 2021-01-16) up to the same day, so the stored build
+    # has no vaccine numbers at all. The new batch runs to 2021-01-25
+    for name in ['population.csv', 'states_india.geojson']:
+        shutil.copy(os.path.join(package_dir, name), tmp_path)
+    monkeypatch.chdir(tmp_path)
+    daily = split_rows(daily_path, lambda row: pd.Timestamp(row.split(',')[1]), '2021-01-05', '2021-01-25')
+    vaccine = split_rows(vaccine_path, lambda row: pd.to_datetime(row.split(',')[0], format='%d/%m/%Y'),
+                         '2021-01-05', '2021-01-25')
+    for path, (header, stored, new) in [(daily_path, daily), (vaccine_path, vaccine)]:
+        write_rows(path, header, stored)
+        write_rows(f'new_{path}', header, new)
+    return daily, vaccine
+
+
+def test_ingest_from_pre_vaccine_history(pre_vaccine_inputs):
+    frames, _ = pipeline.run_pipeline('serial')
+    assert frames['vaccine_cumulative_df'].empty
+
+    frames = ingest.ingest(frames, pd.read_csv(f'new_{daily_path}'), pd.read_csv(f'new_{vaccine_path}'))
+
+    for path, (header, stored, new) in zip([daily_path, vaccine_path], pre_vaccine_inputs):
+        write_rows(path, header, stored + new)
+    rebuilt_frames, _ = pipeline.run_pipeline('serial')
+    for name in ['india_df', 'state_metrics_df', 'date_wise_metrics']:
+        pd.testing.assert_frame_equal(frames[name], rebuilt_frames[name], check_dtype=False, check_freq=False,
+                                      rtol=1e-9)
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+from helper import print_formatted, print_delta
+from kpi_table import kpi_metrics, format_values, format_deltas, get_kpi_table
+
+# Around every rounding and suffix boundary of human_format, plus what the cards can actually be handed
+count_values = [0, 0.004, 0.005, 0.015, 1, 12.345, 999.99, 999.994, 999.995, 999.999, 1000, 1000.5, 1234.5678,
+                999994, 999995, 999999.99, 1e6, 1005000, 123456789, 999994999, 999995000, 1e9, 1.5e9, 1e12, -1500,
+                -0.5, np.nan]
+ratio_values = [0, 0.00004, 0.00005, 0.0001, 0.012345, 0.5, 0.99995, 1, 1.5, -0.01, np.nan]
+
+# (national value, region value)
+delta_pairs = [(0, 0), (0, 5), (0, -5), (100, 100), (100, 150), (100, 50), (100, 100.5), (100, 101.5), (100, 49.5),
+               (100, 1099), (100, 1100), (100, 1100.1), (100, 0), (100, -1000), (3, 1), (3, 2), (0.1, 0.3),
+               (100, np.nan), (1e-300, 1), (-100, -50)]
+
+
+@pytest.mark.parametrize('metric', ['cases_per_million', 'deaths_per_million'])
+def test_count_values(metric):
+    values = np.array(count_values, dtype=float)
+    assert format_values(values, metric).tolist() == [print_formatted(value, metric) for value in values]
+
+
+@pytest.mark.parametrize('metric', ['pct_fully_vaccinated', 'case_fatality_rate'])
+def test_ratio_values(metric):
+    values = np.array(ratio_values, dtype=float)
+    assert format_values(values, metric).tolist() == [print_formatted(value, metric) for value in values]
+
+
+def test_deltas():
+    reference, values = (np.array(column, dtype=float) for column in zip(*delta_pairs))
+    assert format_deltas(values, reference).tolist() == [print_delta(prev, now) for prev, now in delta_pairs]
+
+
+def test_kpi_table_strings():
+    metrics_df = pd.DataFrame({
+        'pct_fully_vaccinated': [0.05, 0.12345, 0.0, 0.05],
+        'cases_per_million': [45000.0, 999.995, 1234567.0, 30000.0],
+        'case_fatality_rate': [0.012, 0.0, 0.03, 0.012],
+        'deaths_per_million': [500.0, 0.0, 1100.0, 600.0],
+    }, index=pd.Index(['Goa', 'Kerala', 'Delhi', 'India'], name='state'))
+    for metric in kpi_metrics:
+        metrics_df[f'{metric}_rank'] = metrics_df[metric].rank(method='max', ascending=False)
+    metrics_df.loc['India', [f'{metric}_rank' for metric in kpi_metrics]] = np.nan
+    kpi_table = get_kpi_table(metrics_df)
+
+    for metric in kpi_metrics:
+        national = metrics_df.loc['India', metric]
+        for region in ['Goa', 'Kerala', 'Delhi']:
+            value = metrics_df.loc[region, metric]
+            assert kpi_table.loc[region, ('value_text', metric)] == print_formatted(value, metric)
+            assert kpi_table.loc[region, ('delta_text', metric)] == \
+                f'{print_delta(prev=national, now=value)} vs National Avg'
+            rank = int(metrics_df.loc[region, f'{metric}_rank'])
+            assert kpi_table.loc[region, ('rank_text', metric)] == f'Rank : {rank} of 3'
+        assert kpi_table.loc['India', ('value_text', metric)] == print_formatted(national, metric)
+        assert kpi_table.loc['India', ('delta_text', metric)] == '-'
+        assert kpi_table.loc['India', ('rank_text', metric)] == '-'
+        assert kpi_table.loc['India', ('color', metric)] == 'white'
+    # Higher is better only for vaccinations
+    assert kpi_table.loc['Kerala', ('color', 'pct_fully_vaccinated')] == '#27ae60'
+    assert kpi_table.loc['Delhi', ('color', 'cases_per_million')] == '#d91e18'
+    assert kpi_table.loc['Goa', ('color', 'case_fatality_rate')] == '#27ae60'
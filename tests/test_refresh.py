@@ -0,0 +1,66 @@
+import os
+import shutil
+import time
+import pytest
+import artifacts
+import builder
+from snapshot import Snapshot, SnapshotStore, DataRefresher, get_unsettled_inputs
+
+package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # Inputs last written well before any refresh interval
+    written = time.time() - 3600
+    for name in artifacts.input_files:
+        shutil.copy(os.path.join(package_dir, name), tmp_path)
+        os.utime(tmp_path / name, (written, written))
+    monkeypatch.chdir(tmp_path)
+    return SnapshotStore(Snapshot(*artifacts.load_or_build_artifacts(served=True)))
+
+
+def change_input(seconds_ago):
+    with open('population.csv', 'a') as f:
+        f.write('\n')
+    written = time.time() - seconds_ago
+    os.utime('population.csv', (written, written))
+
+
+def test_unsettled_inputs(store):
+    change_input(seconds_ago=1)
+    assert get_unsettled_inputs(60) == ['population.csv']
+    assert get_unsettled_inputs(0) == []
+
+
+def test_workers_only_map_what_the_builder_built(store, monkeypatch):
+    builds = []
+    build_frames = artifacts.build_frames
+    monkeypatch.setattr(artifacts, 'build_frames', lambda: builds.append(1) or build_frames())
+    old_version = store.get().version
+    worker = DataRefresher(store, interval=60, build=False)
+    change_input(seconds_ago=1)
+
+    # Nothing is built while the file may still be being written, and never by a worker
+    assert not worker.refresh()
+    assert not builder.build(interval=60)
+    assert builds == [] and store.get().version == old_version
+
+    change_input(seconds_ago=120)
+    assert builder.build(interval=60)
+    assert builds == [1]
+    assert worker.refresh()
+    assert builds == [1]
+    assert store.get().version == artifacts.get_input_hash() != old_version
+    # Already built, the builder has nothing left to do
+    assert builder.build(interval=60)
+    assert builds == [1]
+
+
+def test_single_process_refresher_builds_settled_inputs(store):
+    refresher = DataRefresher(store, interval=60)
+    change_input(seconds_ago=1)
+    assert not refresher.refresh()
+    change_input(seconds_ago=120)
+    assert refresher.refresh()
+    assert store.get().version == artifacts.get_input_hash()
@@ -0,0 +1,155 @@
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import pytest
+import pipeline
+from create_app import create_app
+from district_level import read_districts_csv, get_district_region_metrics
+from snapshot import Snapshot, SnapshotStore
+
+package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cumulative counts grow by (confirmed, deceased) a day for 20 days. Confirmed stops avg_days_to_death (15) days before
+# the last one, on day 5, deaths don't. Unknown is a bucket, not a district, so it never reaches its state
+district_growth = {
+    ('Kerala', 'Ernakulam'): (100, 1),
+    ('Kerala', 'Thrissur'): (300, 2),
+    ('Kerala', 'Unknown'): (50, 5),
+    ('Goa', 'North Goa'): (10, 1),
+    ('Goa', 'South Goa'): (30, 3),
+}
+district_population = {'Ernakulam': 1000000, 'Thrissur': 1000000, 'North Goa': 100000, 'South Goa': 100000}
+
+
+def write_district_inputs(path, with_population=True):
+    dates = pd.date_range('2021-05-01', periods=20)
+    rows = [{'Date': f'{date:%Y-%m-%d}', 'State': state, 'District': district, 'Confirmed': confirmed * (day + 1),
+             'Recovered': 0, 'Deceased': deceased * (day + 1), 'Other': 0, 'Tested': ''}
+            for day, date in enumerate(dates) for (state, district), (confirmed, deceased) in district_growth.items()]
+    pd.DataFrame(rows).to_csv(os.path.join(path, 'districts.csv'), index=False)
+    if with_population:
+        pd.DataFrame({'state': ['Kerala', 'Kerala', 'Goa', 'Goa'], 'district': list(district_population),
+                      'population': list(district_population.values())}).to_csv(
+            os.path.join(path, 'district_population.csv'), index=False)
+    features = [{'type': 'Feature', 'properties': {'st_nm': state, 'district': district},
+                 'geometry': {'type': 'Polygon',
+                              'coordinates': [[[x, 10.], [x + 1, 10.], [x + 1, 11.], [x, 11.], [x, 10.]]]}}
+                for x, (state, district) in enumerate(district_growth)]
+    with open(os.path.join(path, 'districts_india.geojson'), 'w') as f:
+        json.dump({'type': 'FeatureCollection', 'features': features}, f)
+
+
+def get_state_totals_df():
+    # Shaped like get_state_totals_df, Bihar has no districts. Its case counts are ignored, the districts carry them
+    return pd.DataFrame({
+        'Confirmed': [1., 1., 1.],
+        'Deceased': [1., 1., 1.],
+        'Recovered': [1., 1., 1.],
+        'population': [35000000, 1500000, 120000000],
+        'second_doses': [700000., 30000., 0.],
+        'vaccinations': [2100000., 90000., 0.],
+    }, index=pd.Index(['Kerala', 'Goa', 'Bihar'], name='state'))
+
+
+@pytest.fixture
+def districts_df(tmp_path):
+    write_district_inputs(tmp_path)
+    return read_districts_csv(str(tmp_path / 'districts.csv'))
+
+
+def test_district_roll_up(districts_df):
+    population_df = pd.DataFrame({'state': ['Kerala', 'Kerala', 'Goa', 'Goa'], 'district': list(district_population),
+                                  'population': list(district_population.values())})
+    region_metrics = get_district_region_metrics(districts_df, population_df, get_state_totals_df())
+
+    district_df = region_metrics['district'].set_index('id')
+    assert district_df.loc['Ernakulam, Kerala', ['Confirmed', 'Deceased']].tolist() == [500, 20]
+    assert 'Unknown, Kerala' not in district_df.index
+    state_df = region_metrics['state']
+    assert state_df.loc['Kerala', ['Confirmed', 'Deceased', 'population']].tolist() == [2000, 60, 2000000]
+    assert state_df.loc['Goa', ['Confirmed', 'Deceased', 'population']].tolist() == [200, 80, 200000]
+    assert list(state_df.index) == ['Goa', 'Kerala']
+    india = region_metrics['India'].loc['India']
+    assert india[['Confirmed', 'Deceased', 'population']].tolist() == [2200, 140, 2200000]
+
+    # Vaccine doses only exist per state, they are rolled up from there and never handed down to the districts
+    assert state_df.loc['Kerala', 'second_doses'] == 700000
+    assert india['second_doses'] == 730000
+    assert state_df.loc['Kerala', 'pct_fully_vaccinated'] == pytest.approx(0.35)
+    assert not {'second_doses', 'vaccinations', 'pct_fully_vaccinated'} & set(district_df.columns)
+
+
+def test_district_ranks_per_level(districts_df):
+    population_df = pd.DataFrame({'state': ['Kerala', 'Kerala', 'Goa', 'Goa'], 'district': list(district_population),
+                                  'population': list(district_population.values())})
+    region_metrics = get_district_region_metrics(districts_df, population_df, get_state_totals_df())
+
+    district_df = region_metrics['district'].set_index('id')
+    assert district_df['deaths_per_million'].to_dict() == pytest.approx({
+        'Ernakulam, Kerala': 20, 'Thrissur, Kerala': 40, 'North Goa, Goa': 200, 'South Goa, Goa': 600})
+    assert district_df['deaths_per_million_rank'].to_dict() == {
+        'Ernakulam, Kerala': 4, 'Thrissur, Kerala': 3, 'North Goa, Goa': 2, 'South Goa, Goa': 1}
+    # Ties share the lower rank
+    assert district_df['case_fatality_rate_rank'].to_dict() == {
+        'Ernakulam, Kerala': 3, 'Thrissur, Kerala': 4, 'North Goa, Goa': 2, 'South Goa, Goa': 2}
+    state_df = region_metrics['state']
+    assert state_df['deaths_per_million'].to_dict() == pytest.approx({'Goa': 400, 'Kerala': 30})
+    assert state_df['deaths_per_million_rank'].to_dict() == {'Goa': 1, 'Kerala': 2}
+    assert np.isnan(region_metrics['India'].loc['India', 'deaths_per_million_rank'])
+
+
+def test_district_roll_up_without_district_population(districts_df):
+    region_metrics = get_district_region_metrics(districts_df, None, get_state_totals_df())
+
+    assert 'deaths_per_million' not in region_metrics['district']
+    state_df = region_metrics['state']
+    assert state_df.loc['Kerala', 'population'] == 35000000
+    assert state_df.loc['Kerala', 'deaths_per_million'] == pytest.approx(60 / 35)
+    assert region_metrics['India'].loc['India', 'population'] == 36500000
+
+
+@pytest.fixture
+def district_inputs(tmp_path, monkeypatch):
+    for name in ['state_wise_daily.csv', 'cowin_vaccine_data_statewise.csv', 'population.csv',
+                 'states_india.geojson']:
+        shutil.copy(os.path.join(package_dir, name), tmp_path)
+    write_district_inputs(tmp_path)
+    monkeypatch.chdir(tmp_path)
+
+
+def post_map_level(client, level):
+    return client.post('/_dash-update-component', json={
+        'output': '..choropleth.figure...choropleth_title.children..',
+        'outputs': [{'id': 'choropleth', 'property': 'figure'}, {'id': 'choropleth_title', 'property': 'children'}],
+        'inputs': [{'id': 'map_level', 'property': 'value', 'value': level}],
+        'changedPropIds': ['map_level.value']})
+
+
+def test_district_source_drives_every_map_level(district_inputs):
+    state_frames, _ = pipeline.run_pipeline('serial', 'state')
+    frames, _ = pipeline.run_pipeline('serial', 'district')
+
+    state_metrics_df = frames['state_metrics_df']
+    assert list(state_metrics_df.index) == ['Goa', 'Kerala', 'India']
+    assert state_metrics_df['Confirmed'].tolist() == [200, 2000, 2200]
+    assert state_metrics_df.loc['Kerala', 'id'] == state_frames['state_metrics_df'].loc['Kerala', 'id']
+    assert state_metrics_df.loc['Kerala', 'vaccinations'] == state_frames['state_metrics_df'].loc['Kerala',
+                                                                                                  'vaccinations']
+    # The series still come from the state inputs
+    pd.testing.assert_frame_equal(frames['date_wise_metrics'], state_frames['date_wise_metrics'])
+
+    snapshot = Snapshot('district-test', frames)
+    assert list(snapshot.map_levels) == ['state', 'district']
+    client = create_app(SnapshotStore(snapshot)).server.test_client()
+    layout = client.get('/_dash-layout').get_data(as_text=True)
+    assert '"map_level"' in layout
+
+    district_response = json.loads(post_map_level(client, 'district').data)['response']
+    assert district_response['choropleth_title']['children'] == 'Districts with Deaths per million > 250'
+    assert set(district_response['choropleth']['figure']['data'][0]['locations']) == {
+        'Ernakulam, Kerala', 'Thrissur, Kerala', 'North Goa, Goa', 'South Goa, Goa'}
+    state_response = json.loads(post_map_level(client, 'state').data)['response']
+    assert state_response['choropleth_title']['children'] == 'States with Deaths per million > 250'
+    assert post_map_level(client, 'block').status_code == 204
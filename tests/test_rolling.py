@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+from numpy.testing import assert_allclose
+from rolling import get_window_stats
+
+windows = [7, 14, 28]
+
+
+def get_stats(daily, metric='Confirmed', windows=windows):
+    # One metric of one region, the stats come back as (stat, day)
+    stats, _ = get_window_stats(np.asarray(daily, dtype=float)[None, None, :], [metric], windows)
+    return stats[:, 0, 0]
+
+
+def test_window_means_match_pandas_rolling():
+    rng = np.random.default_rng(0)
+    values = rng.poisson(50, size=(2, 3, 90)).astype(float)
+    # Leading days without data, a gap and a lone missing day
+    values[0, 0, :5] = np.nan
+    values[1, 2, 40:43] = np.nan
+    values[0, 1, 60] = np.nan
+    stats, stat_metrics = get_window_stats(values, ['Confirmed', 'Recovered'], windows)
+
+    assert stat_metrics == ['Confirmed', 'Recovered']
+    assert_allclose(stats[0], values)
+    for position, window in enumerate(windows, start=1):
+        for metric in range(2):
+            expected = pd.DataFrame(values[metric].T).rolling(window).mean().to_numpy().T
+            assert_allclose(stats[position, metric], expected, rtol=1e-12)
+
+
+def test_growth_of_doubling_weeks():
+    # 1 a day for a week, then 2, then 4
+    stats = get_stats([1] * 7 + [2] * 7 + [4] * 7)
+    week_over_week, doubling_days = stats[-2], stats[-1]
+
+    assert np.isnan(week_over_week[:13]).all()
+    assert week_over_week[13] == 1 and week_over_week[20] == 1
+    # Weekly sums (7 + 14 + 28) over (7 + 14) and 21 over 7 for the cumulative totals
+    assert_allclose(doubling_days[20], 7 * np.log(2) / np.log(49 / 21))
+    assert_allclose(doubling_days[13], 7 * np.log(2) / np.log(3))
+    assert np.isnan(doubling_days[:7]).all()
+
+
+def test_flat_and_falling_growth():
+    flat = get_stats([10] * 21)
+    assert (flat[-2, 13:] == 0).all()
+    # The cumulative total still grows, by (t + 1) / (t - 6) over the week
+    t = np.arange(7, 21)
+    assert_allclose(flat[-1, 7:], 7 * np.log(2) / np.log((t + 1) / (t - 6)))
+
+    falling = get_stats([4] * 7 + [2] * 7)
+    assert falling[-2, 13] == -0.5
+
+    # A total that stopped growing never doubles, and a week without cases has no growth to speak of
+    stopped = get_stats([5] * 7 + [0] * 14)
+    assert stopped[-2, 13] == -1
+    assert np.isnan(stopped[-2, 20])
+    assert np.isnan(stopped[-1, 13:]).all()
+
+    # Corrections can make a day negative, the stats stay finite or NaN
+    corrected = get_stats([10] * 10 + [-200] + [10] * 10)
+    assert np.isnan(corrected[-1, 10:17]).all()
+    assert not np.isinf(corrected).any()
+
+
+def test_leading_missing_days():
+    stats = get_stats([np.nan] * 3 + [7] * 18)
+    assert np.isnan(stats[1, :9]).all()
+    assert (stats[1, 9:] == 7).all()
+    # Missing days count as 0 in the cumulative totals
+    assert stats[-2, 16] == 0
+    assert_allclose(stats[-1, 10], 7 * np.log(2) / np.log(8 / 1))
+
+
+def test_window_longer_than_history():
+    stats = get_stats(np.arange(10), windows=[7, 28])
+    assert_allclose(stats[1, 6:], np.arange(3, 7))
+    assert np.isnan(stats[2]).all()
+    assert np.isnan(stats[-2]).all()
+    assert np.isnan(get_stats([1, 2], windows=[7])[1:]).all()
+
+
+def test_window_ratio_metrics():
+    vaccinations = np.arange(1, 22, dtype=float)
+    second_doses = vaccinations / 4
+    second_doses[:7] = 0
+    values = np.stack([vaccinations, second_doses])[:, None, :]
+    stats, stat_metrics = get_window_stats(values, ['vaccinations', 'second_doses'], [7])
+
+    assert stat_metrics == ['vaccinations', 'second_doses', 'second_dose_share']
+    # Ratios of the window sums, not means of the daily ratios
+    assert_allclose(stats[0, 2, 0], second_doses / vaccinations)
+    assert_allclose(stats[1, 2, 0, 13:], 0.25)
+    assert_allclose(stats[1, 2, 0, 10], second_doses[4:11].sum() / vaccinations[4:11].sum())
+    assert np.isnan(stats[1, 2, 0, :6]).all()
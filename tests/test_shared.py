@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+from artifacts import save_frame, load_frame
+from shared import split_blocks, frame_from_blocks, share_frame, is_file_backed
+
+
+def get_mixed_frame():
+    # Runs of float, int and object columns interleaved, the way india_df and date_wise_metrics come out of the pipeline
+    dates = pd.DatetimeIndex(pd.date_range('2021-01-01', periods=6).tolist(), name='Date')
+    columns = pd.MultiIndex.from_tuples([('Confirmed', 'Kerala'), ('Confirmed', 'Goa'), ('population', 'Kerala'),
+                                         ('state', 'label'), ('Deceased', 'Kerala'), ('Deceased', 'Goa')],
+                                        names=[None, 'state'])
+    return pd.DataFrame({
+        0: np.arange(6, dtype=float),
+        1: [np.nan, 1.5, 2., 3., 4., 5.],
+        2: np.full(6, 35000000, dtype=np.int64),
+        3: ['India', 'India', None, 'India', 'India', 'India'],
+        4: np.linspace(0, 1, 6),
+        5: np.zeros(6),
+    }, index=dates).set_axis(columns, axis=1)
+
+
+def test_blocks_round_trip():
+    df = get_mixed_frame()
+    blocks = split_blocks(df)
+    assert [positions for positions, _ in blocks] == [[0, 1, 4, 5], [2], [3]]
+    assert_frame_equal(frame_from_blocks(blocks, df.index, df.columns), df)
+    # Positions in any order, as columnar.py hands them over
+    assert_frame_equal(frame_from_blocks(blocks[::-1], df.index, df.columns), df)
+
+
+def test_mmap_store_round_trip(tmp_path):
+    df = get_mixed_frame()
+    save_frame(df, str(tmp_path / 'frame'))
+    loaded_df = load_frame(str(tmp_path / 'frame'))
+    assert_frame_equal(loaded_df, df)
+
+
+def test_mmap_store_maps_grouped_dtypes(tmp_path):
+    # A frame whose dtypes don't interleave is read from the page cache, not copied onto the heap
+    df = get_mixed_frame().iloc[:, [0, 1, 4, 5, 2]]
+    save_frame(df, str(tmp_path / 'frame'))
+    loaded_df = load_frame(str(tmp_path / 'frame'))
+    assert_frame_equal(loaded_df, df)
+    assert is_file_backed(loaded_df[('Deceased', 'Goa')].to_numpy())
+    assert is_file_backed(loaded_df[('population', 'Kerala')].to_numpy())
+
+
+def test_share_frame():
+    df = get_mixed_frame()
+    shared_df = share_frame(df)
+    assert_frame_equal(shared_df, df)
+    shared_df = share_frame(df.iloc[:, [0, 1, 4, 5, 2]])
+    assert not shared_df[('Confirmed', 'Kerala')].to_numpy().flags.writeable
+
@@ -1,20 +1,70 @@
 import pandas as pd
+from pandas.api.types import is_datetime64_any_dtype, union_categoricals
+from config import cowin_chunk_rows
+from columnar import load_or_convert
+from metrics import timed
 
+dose_columns = ['Total Doses Administered', 'First Dose Administered', 'Second Dose Administered']
+cumulative_columns = ['Updated On', 'State'] + dose_columns
+# The only columns read from the CoWIN dump, however many age band / vaccine brand columns it grows
+cowin_dtypes = {'State': 'category', **{column: 'float64' for column in dose_columns}}
 
-def add_daily_vaccinations(state_df):
-    state_df['vaccinations'] = state_df['Total Doses Administered'].diff()
-    state_df['first_doses'] = state_df['First Dose Administered'].diff()
-    state_df['second_doses'] = state_df['Second Dose Administered'].diff()
-    return state_df
 
+def parse_cowin_dates(values):
+    return pd.to_datetime(values, format='%d/%m/%Y')
 
-vaccine_df = pd.read_csv('cowin_vaccine_data_statewise.csv')
-vaccine_df = vaccine_df.groupby('State').apply(add_daily_vaccinations)
-vaccine_df = vaccine_df[['Updated On', 'State', 'vaccinations', 'first_doses', 'second_doses']]
-vaccine_df.columns = ['Date', 'state', 'vaccinations', 'first_doses', 'second_doses']
-vaccine_df['Date'] = pd.to_datetime(vaccine_df['Date'], format='%d/%m/%Y')
-vaccine_df.dropna(inplace=True)
 
+def prepare_cowin_df(raw_vaccine_df):
+    # Brings a CoWIN frame that didn't come through read_cowin_csv (e.g. a batch handed to ingest.py) to the same shape
+    cowin_df = raw_vaccine_df[cumulative_columns].astype(cowin_dtypes)
+    if not is_datetime64_any_dtype(cowin_df['Updated On']):
+        cowin_df['Updated On'] = parse_cowin_dates(cowin_df['Updated On'])
+    return cowin_df
+
+
+@timed
+def read_cowin_csv(path):
+    # Read in chunks so only the pruned, typed columns of a large dump are ever held in memory
+    chunks = list(pd.read_csv(path, usecols=cumulative_columns, dtype=cowin_dtypes, parse_dates=['Updated On'],
+                              date_parser=parse_cowin_dates, chunksize=cowin_chunk_rows))
+    cowin_df = pd.concat(chunks, ignore_index=True)[cumulative_columns]
+    if len(chunks) > 1:
+        cowin_df['State'] = union_categoricals([chunk['State'] for chunk in chunks])
+    return cowin_df
+
+
+def load_cowin_df(path):
+    return load_or_convert(path, 'cowin', read_cowin_csv)
+
+
+@timed
+def get_daily_vaccinations_df(raw_vaccine_df):
+    cowin_df = prepare_cowin_df(raw_vaccine_df)
+    daily_df = cowin_df[dose_columns].groupby(cowin_df['State'], sort=False, observed=True).diff()
+    vaccine_df = pd.DataFrame({
+        'Date': cowin_df['Updated On'],
+        'state': cowin_df['State'].astype(object),
+        'vaccinations': daily_df['Total Doses Administered'],
+        'first_doses': daily_df['First Dose Administered'],
+        'second_doses': daily_df['Second Dose Administered'],
+    })
+    return vaccine_df.dropna()
+
+
+@timed
+def get_vaccine_cumulative_df(raw_vaccine_df):
+    # Last cumulative row per state, all the incremental ingest needs to diff the next day against
+    cowin_df = prepare_cowin_df(raw_vaccine_df)
+    vaccine_cumulative_df = cowin_df.groupby('State', sort=False, observed=True).tail(1).reset_index(drop=True)
+    return vaccine_cumulative_df.astype({'State': object})
+
+
+@timed
+def load_vaccine_data(path='cowin_vaccine_data_statewise.csv'):
+    cowin_df = load_cowin_df(path)
+    vaccine_df = get_daily_vaccinations_df(cowin_df)
+    vaccine_cumulative_df = get_vaccine_cumulative_df(cowin_df)
+    return vaccine_df, vaccine_cumulative_df
 
 
 def get_state_vaccine_totals_df(vaccine_df):
@@ -24,4 +74,4 @@ def get_state_vaccine_totals_df(vaccine_df):
                         values=['vaccinations', 'second_doses'],
                         aggfunc='sum'
                     )
-    return state_vaccine_totals_df
\ No newline at end of file
+    return state_vaccine_totals_df